@@ -62,6 +62,18 @@ def create_app(test_config: dict = None) -> Flask:
         os.environ.get('DATABASE_URL') or 'sqlite:///classpulse_flask.db'
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Applied to every new SQLite connection (see _apply_sqlite_pragmas): WAL
+    # so readers don't block on the writer, a busy timeout instead of instant
+    # "database is locked", and bigger caches. SQLITE_TUNING=false disables;
+    # ignored for other databases.
+    app.config['SQLITE_PRAGMAS'] = {
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    } if _env_bool('SQLITE_TUNING', True) else {}
 
     # Session cookie hardening. Secure is opt-in via env so local HTTP dev still
     # works; set SESSION_COOKIE_SECURE=true when serving over HTTPS.
@@ -88,6 +100,10 @@ def create_app(test_config: dict = None) -> Flask:
     app.config['IMAGE_MAX_DIM'] = int(os.environ.get('IMAGE_MAX_DIM', 1600))
     app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000))
     app.config['UPLOAD_DIR'] = os.path.join(app.instance_path, 'uploads')
+    # Join-link QR images, drawn once and kept on disk (see qr.py) plus the
+    # QR_CACHE_SIZE most recently used in memory.
+    app.config['QR_CACHE_DIR'] = os.path.join(app.instance_path, 'qr')
+    app.config['QR_CACHE_SIZE'] = int(os.environ.get('QR_CACHE_SIZE', 64))
     app.config['MAX_CONTENT_LENGTH'] = max(_non_upload_body_limit, app.config['UPLOAD_MAX_BYTES'])
 
     # Email-driven registration/reset knobs (the provider itself is configured
@@ -123,6 +139,30 @@ def create_app(test_config: dict = None) -> Flask:
     app.config.setdefault('RATELIMIT_STORAGE_URI',
                           os.environ.get('RATELIMIT_STORAGE_URI', 'memory://'))
 
+    # Questions whose result tallies are kept in memory (see aggregates.py);
+    # the least recently used fall back to the persisted tables.
+    app.config['AGGREGATE_CACHE_SIZE'] = int(os.environ.get('AGGREGATE_CACHE_SIZE', 1024))
+    # Live word clouds show (and keep in memory) only the top this-many terms;
+    # the results page still shows every term. 0 = no cap.
+    app.config['WORD_CLOUD_TOP_K'] = int(os.environ.get('WORD_CLOUD_TOP_K', 100))
+    # Short answers travel in pages of this many, newest first; older pages
+    # and newer arrivals are fetched by cursor.
+    app.config['SHORT_ANSWER_PAGE_SIZE'] = int(os.environ.get('SHORT_ANSWER_PAGE_SIZE', 100))
+    # Equal-width buckets in a numeric question's histogram.
+    app.config['NUMERIC_HISTOGRAM_BUCKETS'] = int(
+        os.environ.get('NUMERIC_HISTOGRAM_BUCKETS', 10))
+    # Live result pushes are coalesced per question over this many ms, so a
+    # burst of submissions costs one stats computation and one emit per window.
+    # 0 emits on every response.
+    app.config['RESULTS_BROADCAST_WINDOW_MS'] = int(
+        os.environ.get('RESULTS_BROADCAST_WINDOW_MS', 250))
+    # Opt-in write-behind for audience responses (see responses.py): queue
+    # them and group-commit every this-many ms, or once MAX_ROWS are waiting.
+    # 0 (the default) commits each response in its own request.
+    app.config['RESPONSE_WRITE_BEHIND_MS'] = int(os.environ.get('RESPONSE_WRITE_BEHIND_MS', 0))
+    app.config['RESPONSE_WRITE_BEHIND_MAX_ROWS'] = int(
+        os.environ.get('RESPONSE_WRITE_BEHIND_MAX_ROWS', 200))
+
     if test_config:
         app.config.update(test_config)
 
@@ -143,6 +183,7 @@ def create_app(test_config: dict = None) -> Flask:
 
     # --- Extensions ---
     db.init_app(app)
+    _apply_sqlite_pragmas(app)
     csrf.init_app(app)
     limiter.init_app(app)
     # Import sockets BEFORE socketio.init_app: handlers registered before the
@@ -158,6 +199,7 @@ def create_app(test_config: dict = None) -> Flask:
         async_mode=os.environ.get('SOCKETIO_ASYNC_MODE') or None,
         message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None,
     )
+    sockets.init_app(app)
 
     # --- AI availability (module-level config; imported for the flag) ---
     from . import ai
@@ -252,7 +294,15 @@ def create_app(test_config: dict = None) -> Flask:
         return jsonify({"status": "ok", "version": APP_VERSION})
 
     # --- Routes ---
-    from . import admin, audience, auth, presenter, proposals, uploads
+    from . import (
+        admin, aggregates, audience, auth, exports, presenter, proposals, qr, responses, uploads,
+        utils,
+    )
+    utils.init_app(app)
+    exports.init_app(app)
+    qr.init_app(app)
+    aggregates.init_app(app)
+    responses.init_app(app)
     auth.init_app(app)
     presenter.init_app(app)
     audience.init_app(app)
@@ -278,12 +328,53 @@ def create_app(test_config: dict = None) -> Flask:
     return app
 
 
+# Accepted values for the non-numeric SQLite pragmas; anything else in the
+# environment is ignored with a warning rather than spliced into SQL.
+_SQLITE_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+
+
+def _apply_sqlite_pragmas(app):
+    """Run SQLITE_PRAGMAS on each new connection when the database is SQLite.
+    journal_mode is skipped for in-memory databases, which can't use WAL."""
+    from sqlalchemy import event
+    pragmas = {}
+    for name, value in (app.config.get('SQLITE_PRAGMAS') or {}).items():
+        choices = _SQLITE_PRAGMA_CHOICES.get(name)
+        if choices is None:
+            pragmas[name] = int(value)
+        elif str(value).upper() in choices:
+            pragmas[name] = str(value).upper()
+        else:
+            app.logger.warning(f"Ignoring SQLite pragma {name}={value!r}; "
+                               f"expected one of {', '.join(sorted(choices))}")
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    if engine.url.database in (None, '', ':memory:'):
+        pragmas.pop('journal_mode', None)
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
 # Columns added to EXISTING tables after their initial release. create_all()
 # never alters tables, so each entry here is applied with a plain
 # ALTER TABLE ... ADD COLUMN (works on SQLite and PostgreSQL) when missing.
 _ADDITIVE_COLUMNS = [
     ('session', 'allow_proposals', 'BOOLEAN NOT NULL DEFAULT 0'),
     ('user', 'session_token', 'VARCHAR(32)'),
+    ('session', 'code_normalized', 'VARCHAR(6)'),
 ]
 
 
@@ -299,3 +390,163 @@ def _apply_additive_migrations(app):
             db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl_type}'))
             db.session.commit()
             app.logger.info(f"Schema migration: added {table}.{column}")
+    _backfill_session_codes(app)
+    _apply_response_uniqueness(app, inspector)
+    _apply_missing_indexes(app)
+
+
+def _backfill_session_codes(app):
+    """Fill session.code_normalized where it's missing, before its unique
+    index is created. Codes issued before the alphabet was narrowed can fold
+    onto the same value; the live session keeps it — or, if none is live, the
+    newest — and the others are left NULL (unreachable by typed code) with a
+    warning."""
+    from sqlalchemy import text
+
+    from .models import normalize_session_code
+    try:
+        pending = db.session.execute(text(
+            'SELECT id, code, active, archived, deleted FROM session '
+            'WHERE code_normalized IS NULL')).all()
+    except Exception:
+        db.session.rollback()
+        return
+    if not pending:
+        return
+    # Live sessions first, then newest first: whichever comes first claims a code.
+    pending.sort(key=lambda row: (bool(row.active and not row.archived and not row.deleted),
+                                  row.id), reverse=True)
+    taken = {code for (code,) in db.session.execute(text(
+        'SELECT code_normalized FROM session WHERE code_normalized IS NOT NULL'))}
+    clashes = []
+    for session_id, code, *_ in pending:
+        folded = normalize_session_code(code)
+        if folded in taken:
+            clashes.append(session_id)
+            continue
+        taken.add(folded)
+        db.session.execute(text('UPDATE session SET code_normalized = :folded WHERE id = :id'),
+                           {'folded': folded, 'id': session_id})
+    db.session.commit()
+    app.logger.info(f"Schema migration: backfilled session.code_normalized for "
+                    f"{len(pending) - len(clashes)} sessions")
+    if clashes:
+        app.logger.warning(f"Schema migration: sessions {sorted(clashes)} have codes that fold "
+                           f"onto another session's; they can no longer be joined by code")
+
+
+def _apply_missing_indexes(app):
+    """Create any index declared on the models but missing from an existing
+    table (create_all() only indexes tables it creates). On PostgreSQL they
+    are built CONCURRENTLY so a live table isn't write-locked meanwhile.
+
+    A concurrent build that fails (say, a live worker wrote a duplicate
+    answer after the dedupe) leaves an INVALID index behind, which upserts'
+    ON CONFLICT can't use. One found at startup is dropped and rebuilt —
+    response's unique index after deduping again. If a unique index still
+    can't be built, startup stops rather than run without it."""
+    from sqlalchemy import inspect, text
+    from sqlalchemy.exc import DBAPIError
+    inspector = inspect(db.engine)  # fresh: the steps above may have added some
+    concurrently = db.engine.dialect.name == 'postgresql'
+    invalid = _invalid_indexes() if concurrently else set()
+    for table in db.metadata.sorted_tables:
+        try:
+            existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        except Exception:
+            continue  # table doesn't exist yet; create_all just made it complete
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in existing and index.name not in invalid:
+                continue
+            ddl = (f'CREATE {"UNIQUE " if index.unique else ""}INDEX '
+                   f'{"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS {index.name} '
+                   f'ON "{table.name}" ({", ".join(c.name for c in index.columns)})')
+            for attempt in range(_INDEX_BUILD_ATTEMPTS):
+                if index.name in invalid:
+                    app.logger.warning(f"Schema migration: rebuilding invalid index {index.name}")
+                    _autocommit(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}')
+                    if index.name == 'uq_response_question_respondent':
+                        _dedupe_responses(app)
+                        db.session.commit()
+                try:
+                    if concurrently:
+                        _autocommit(ddl)
+                    else:
+                        db.session.execute(text(ddl))
+                        db.session.commit()
+                except DBAPIError as exc:
+                    db.session.rollback()
+                    if not concurrently or attempt + 1 == _INDEX_BUILD_ATTEMPTS:
+                        if concurrently:
+                            _autocommit(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}')
+                        raise RuntimeError(
+                            f"Schema migration: could not build index {index.name} on "
+                            f"{table.name}: {exc.orig}. Remove the offending rows and "
+                            f"restart.") from exc
+                    invalid.add(index.name)
+                    continue
+                invalid.discard(index.name)
+                break
+            app.logger.info(f"Schema migration: added index {index.name}")
+
+
+# A failed CONCURRENTLY build is dropped, deduped and retried this many times
+# in all before startup gives up.
+_INDEX_BUILD_ATTEMPTS = 2
+
+
+def _autocommit(ddl):
+    """Run PostgreSQL DDL that isn't allowed inside a transaction block."""
+    from sqlalchemy import text
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(ddl))
+
+
+def _invalid_indexes():
+    """Names of the PostgreSQL indexes left INVALID by a failed build."""
+    from sqlalchemy import text
+    # Its own connection: a CONCURRENTLY build waits out open transactions,
+    # so one left open here would stall it.
+    with db.engine.connect() as conn:
+        return {name for (name,) in conn.execute(text(
+            'SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE NOT i.indisvalid AND pg_table_is_visible(c.oid)'))}
+
+
+def _dedupe_responses(app):
+    """Delete duplicate answers racing submissions may have left, keeping
+    each respondent's newest row, and drop the affected questions' tallies
+    to be rebuilt. No commit."""
+    from sqlalchemy import text
+    dup_questions = [qid for (qid,) in db.session.execute(text(
+        'SELECT DISTINCT question_id FROM response GROUP BY question_id, respondent_id '
+        'HAVING COUNT(*) > 1'))]
+    if not dup_questions:
+        return
+    deleted = db.session.execute(text(
+        'DELETE FROM response WHERE id NOT IN (SELECT MAX(id) FROM response '
+        'GROUP BY question_id, respondent_id)')).rowcount
+    from .aggregates import delete_for_questions
+    delete_for_questions(dup_questions)
+    app.logger.warning(f"Schema migration: removed {deleted} duplicate responses "
+                       f"across {len(dup_questions)} questions")
+
+
+def _apply_response_uniqueness(app, inspector):
+    """Give an existing response table its unique (question_id, respondent_id)
+    index. Racing submissions from before it existed may have left duplicate
+    answers, so those are deleted first (keeping each respondent's newest
+    row) and the affected questions' tallies dropped to be rebuilt."""
+    from sqlalchemy import text
+    try:
+        indexes = {ix['name'] for ix in inspector.get_indexes('response')}
+    except Exception:
+        return
+    if 'uq_response_question_respondent' in indexes:
+        return
+    _dedupe_responses(app)
+    db.session.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_response_question_respondent '
+        'ON response (question_id, respondent_id)'))
+    db.session.commit()
+    app.logger.info("Schema migration: added unique index on response(question_id, respondent_id)")
@@ -7,10 +7,12 @@ rather than hiding it. This is the counterpart to the reversible *block* state
 up. See [[surface-email-send-failures]] context in auth.py for the block path.
 """
 
+from .aggregates import delete_for_questions
 from .extensions import db
 from .models import (
-    EmailCode, Proposal, ProposalVote, Question, Response, Session, User,
+    EmailCode, Proposal, ProposalVote, Question, Response, Session, SessionSnapshot, User,
 )
+from .utils import forget_session_code
 
 
 def _delete_session_rows(session_id):
@@ -24,7 +26,10 @@ def _delete_session_rows(session_id):
          .filter(ProposalVote.proposal_id.in_(proposal_ids))
          .delete(synchronize_session=False))
     Proposal.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+    delete_for_questions(
+        qid for (qid,) in db.session.query(Question.id).filter_by(session_id=session_id))
     Response.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+    SessionSnapshot.query.filter_by(session_id=session_id).delete(synchronize_session=False)
     Question.query.filter_by(session_id=session_id).delete(synchronize_session=False)
     Session.query.filter_by(id=session_id).delete(synchronize_session=False)
 
@@ -39,8 +44,11 @@ def purge_session(session_id):
     """
     from .uploads import delete_session_uploads  # lazy: see purge_user
 
+    codes = db.session.query(Session.code).filter_by(id=session_id).all()
     _delete_session_rows(session_id)
     db.session.commit()
+    for (code,) in codes:
+        forget_session_code(code)
     delete_session_uploads(session_id)
 
 
@@ -51,7 +59,8 @@ def purge_user(user):
     from .uploads import delete_session_uploads
 
     user_id = user.id
-    session_ids = [s.id for s in Session.query.filter_by(user_id=user_id).all()]
+    owned = db.session.query(Session.id, Session.code).filter_by(user_id=user_id).all()
+    session_ids = [sid for sid, _ in owned]
 
     for sid in session_ids:
         _delete_session_rows(sid)
@@ -62,6 +71,8 @@ def purge_user(user):
     User.query.filter_by(id=user_id).delete(synchronize_session=False)
     db.session.commit()
 
+    for _, code in owned:
+        forget_session_code(code)
     for sid in session_ids:
         delete_session_uploads(sid)
 
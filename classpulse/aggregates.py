@@ -0,0 +1,471 @@
+"""Running per-question result tallies, so stats don't rescan every response.
+
+Each response write records a diff here. The persisted QuestionAggregate and
+QuestionTally rows are adjusted in the same transaction as the Response itself
+(so they survive a restart), and once that transaction commits the same diff is
+applied to an in-process copy, making a question's tallies a dict lookup.
+
+Tallies are keyed by *bucket*: an option label, a rating, a ranked option
+(whose weight accumulates the positions it was given), a distinct numeric
+answer, or a word-cloud term of a free-text answer, tokenised here once
+rather than on every read. Stats read choice buckets through the question's
+current options, so a stray value never becomes a bar.
+
+The in-process copy is a per-app LRU. Every write bumps the aggregate's
+version, and a diff only applies on top of the version it was computed
+against; anything out of step is dropped and reloaded from the tables.
+"""
+
+import heapq
+import math
+import threading
+from collections import Counter, OrderedDict
+from operator import itemgetter
+
+from flask import current_app
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import QuestionAggregate, QuestionTally, Response
+from .questions import compiled_options
+from .words import cloud_words
+
+# multiple_choice_other folds every free-text answer into this one bar.
+OTHER_BUCKET = 'Other'
+
+# Types whose buckets are word-cloud terms, an unbounded vocabulary.
+WORD_TYPES = frozenset(('word_cloud', 'short_answer'))
+
+# The word sketch tracks this many times WORD_CLOUD_TOP_K terms, so ones just
+# outside the top K aren't evicted as soon as a few new words arrive.
+_SKETCH_HEADROOM = 2
+
+_EXTENSION_KEY = 'classpulse_tallies'
+_PENDING_KEY = 'classpulse_tally_diffs'
+_RELEASE_KEY = 'classpulse_tally_releases'
+
+
+class Tallies:
+    """A point-in-time copy of one question's aggregate.
+
+    With a `capacity`, `counts` is a Space-Saving sketch of at most that many
+    heavy hitters instead of every bucket: a new bucket arriving when it's full
+    evicts the smallest and inherits its count, so counts are over-estimates
+    by at most the evicted count, but the true top terms always survive.
+    Used for word clouds, whose vocabulary is unbounded.
+    """
+    __slots__ = ('version', 'total', 'counts', 'weights', 'capacity')
+
+    def __init__(self, version, total, counts=None, weights=None, capacity=None):
+        self.version = version
+        self.total = total
+        self.counts = dict(counts or {})
+        self.weights = dict(weights or {})
+        self.capacity = capacity
+
+    def copy(self):
+        return Tallies(self.version, self.total, self.counts, self.weights, self.capacity)
+
+    def bounded(self, capacity):
+        """A copy keeping only the `capacity` largest live buckets (None = all)."""
+        if capacity is None:
+            return Tallies(self.version, self.total, self.counts, self.weights)
+        live = [(b, c) for b, c in self.counts.items() if c > 0]
+        top = heapq.nlargest(capacity, live, key=itemgetter(1))
+        return Tallies(self.version, self.total, top,
+                       {b: self.weights.get(b, 0.0) for b, _ in top}, capacity)
+
+    def add(self, bucket, count, weight):
+        if self.capacity is not None and bucket not in self.counts:
+            if count <= 0:
+                return  # not monitored, so nothing to take it from
+            if len(self.counts) >= self.capacity:
+                victim = min(self.counts, key=self.counts.get)
+                count += self.counts.pop(victim)
+                self.weights.pop(victim, None)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.weights[bucket] = self.weights.get(bucket, 0.0) + weight
+        if self.capacity is not None and self.counts[bucket] <= 0:
+            del self.counts[bucket]  # free the slot for a live term
+            self.weights.pop(bucket, None)
+
+    def top(self, k):
+        """The k largest (bucket, count) pairs, largest first."""
+        return heapq.nlargest(k, ((b, c) for b, c in self.counts.items() if c > 0),
+                              key=itemgetter(1))
+
+
+class _TallyCache:
+    """LRU of question_id -> Tallies for one app, plus the unwritten diffs
+    read on top of them, all guarded by one lock: a write-behind answer's
+    commit is applied and its held diff released in the same critical
+    section, so a cache hit never counts it twice or not at all.
+
+    A miss is looser: the tables are read outside the lock, and a flush
+    committing between that read and with_unwritten() can leave one answer
+    counted twice (or not at all) in that one read. Only the read is off —
+    what's cached comes from the tables alone — and the flush's broadcast
+    follows with exact counts."""
+
+    def __init__(self, max_questions):
+        self._lock = threading.Lock()
+        self._max = max(1, int(max_questions))
+        self._entries = OrderedDict()
+        # Newest version known to be committed per question, so a reader that
+        # loaded before a concurrent write can't cache what it read.
+        self._floor = OrderedDict()
+        self._unwritten = _Unwritten()
+
+    def get(self, question_id):
+        """A copy of the cached tallies with unwritten diffs added, or None."""
+        with self._lock:
+            t = self._entries.get(question_id)
+            if t is None:
+                return None
+            self._entries.move_to_end(question_id)
+            t = t.copy()
+            self._unwritten.apply(question_id, t)
+            return t
+
+    def with_unwritten(self, question_id, t):
+        """Add unwritten diffs to `t`, freshly loaded (not a cached copy);
+        see the class docstring for the race this leaves open."""
+        with self._lock:
+            self._unwritten.apply(question_id, t)
+        return t
+
+    def hold(self, question_id, total_delta, diff, sign):
+        with self._lock:
+            self._unwritten.add(question_id, total_delta, diff, sign)
+
+    def put(self, question_id, tallies):
+        with self._lock:
+            if tallies.version < self._floor.get(question_id, -1):
+                return
+            current = self._entries.get(question_id)
+            if current is not None and current.version >= tallies.version:
+                return
+            self._entries[question_id] = tallies.copy()
+            self._entries.move_to_end(question_id)
+            while len(self._entries) > self._max:
+                self._entries.popitem(last=False)
+
+    def publish(self, committed, released):
+        """Apply `committed` (question_id, version, total_delta, diff) write
+        diffs and drop `released` (question_id, total_delta, diff) unwritten
+        ones, as one step."""
+        with self._lock:
+            for question_id, total_delta, diff in released:
+                self._unwritten.add(question_id, total_delta, diff, -1)
+            for question_id, version, total_delta, diff in committed:
+                self._apply(question_id, version, total_delta, diff)
+
+    def _apply(self, question_id, version, total_delta, diff):
+        self._floor[question_id] = max(version, self._floor.get(question_id, -1))
+        self._floor.move_to_end(question_id)
+        while len(self._floor) > self._max:
+            self._floor.popitem(last=False)
+        t = self._entries.get(question_id)
+        if t is None:
+            return
+        if version != t.version + 1:
+            del self._entries[question_id]  # missed a write; reload on next read
+            return
+        t.version = version
+        t.total += total_delta
+        for bucket, (count, weight) in diff.items():
+            t.add(bucket, count, weight)
+
+    def discard(self, question_ids):
+        with self._lock:
+            for qid in question_ids:
+                self._entries.pop(qid, None)
+                self._floor.pop(qid, None)
+
+
+class _Unwritten:
+    """Per-question tally diffs of responses accepted but not yet written
+    (see responses.py's write-behind buffer), added on top of every read so
+    live stats include them before they reach the database. Guarded by the
+    owning _TallyCache's lock."""
+
+    def __init__(self):
+        self._entries = {}  # question_id -> [total, Counter counts, Counter weights]
+
+    def add(self, question_id, total_delta, diff, sign):
+        entry = self._entries.setdefault(question_id, [0, Counter(), Counter()])
+        entry[0] += sign * total_delta
+        for bucket, (count, weight) in diff.items():
+            entry[1][bucket] += sign * count
+            entry[2][bucket] += sign * weight
+        if not entry[0] and not any(entry[1].values()) and not any(entry[2].values()):
+            del self._entries[question_id]
+
+    def apply(self, question_id, t):
+        entry = self._entries.get(question_id)
+        if entry is None:
+            return
+        t.total += entry[0]
+        for bucket, count in entry[1].items():
+            t.add(bucket, count, entry[2].get(bucket, 0.0))
+
+
+def _cache():
+    return current_app.extensions[_EXTENSION_KEY]
+
+
+def _capacity(question):
+    """How many buckets the in-process copy keeps (None = all of them)."""
+    top_k = current_app.config['WORD_CLOUD_TOP_K']
+    if question.type in WORD_TYPES and top_k > 0:
+        return top_k * _SKETCH_HEADROOM
+    return None
+
+
+def _contributions(question, value):
+    """(bucket, weight) pairs one response value adds to its question's tallies."""
+    value = str(value)
+    q_type = question.type
+    if q_type in ('multiple_choice', 'rating', 'image_choice'):
+        return [(value, 0.0)]
+    if q_type == 'multiple_choice_other':
+        listed = value in compiled_options(question).label_set
+        return [(value if listed else OTHER_BUCKET, 0.0)]
+    if q_type == 'multi_select':
+        return [(sel, 0.0) for sel in value.split('\n')]
+    if q_type == 'ranking':
+        return [(opt, float(pos)) for pos, opt in enumerate(value.split('\n'), 1)]
+    if q_type in WORD_TYPES:
+        return [(word, 0.0) for word in cloud_words(value)]
+    if q_type == 'numeric':
+        # One bucket per distinct value, spelled canonically so '2.50' and
+        # '2.5' count together; the histogram and quantiles derive from these.
+        try:
+            number = float(value)
+        except ValueError:
+            return []
+        return [(repr(number), 0.0)] if math.isfinite(number) else []
+    return []
+
+
+def response_diff(question, old_value, new_value):
+    """(total_delta, {bucket: (count_delta, weight_delta)}) for replacing
+    old_value (None for a first answer) with new_value."""
+    counts, weights = Counter(), Counter()
+    for value, sign in ((old_value, -1), (new_value, 1)):
+        if value is None:
+            continue
+        for bucket, weight in _contributions(question, value):
+            counts[bucket] += sign
+            weights[bucket] += sign * weight
+    total_delta = 0 if old_value is not None else 1
+    return total_delta, {b: (counts[b], weights[b]) for b in counts if counts[b] or weights[b]}
+
+
+def value_counts(question_id):
+    """(response_value, count) pairs for a question, counted by the database.
+
+    Only distinct values cross the wire, not one ORM object per response. The
+    newline-joined multi_select/ranking encodings group by whole combination;
+    callers split those and weight each part by the combination's count.
+    """
+    return db.session.execute(
+        select(Response.response_value, func.count())
+        .where(Response.question_id == question_id)
+        .group_by(Response.response_value)).all()
+
+
+def _load(question_id, capacity=None):
+    """The persisted aggregate for `question_id`, or None if never built.
+    With a capacity, only that many of the largest buckets are read."""
+    head = db.session.execute(
+        select(QuestionAggregate.version, QuestionAggregate.total_responses)
+        .where(QuestionAggregate.question_id == question_id)).first()
+    if head is None:
+        return None
+    t = Tallies(head.version, head.total_responses, capacity=capacity)
+    rows = (select(QuestionTally.bucket, QuestionTally.count, QuestionTally.weight)
+            .where(QuestionTally.question_id == question_id))
+    if capacity is not None:
+        rows = rows.where(QuestionTally.count > 0) \
+            .order_by(QuestionTally.count.desc()).limit(capacity)
+    for bucket, count, weight in db.session.execute(rows):
+        t.counts[bucket] = count
+        t.weights[bucket] = weight
+    return t
+
+
+def exact_counts(question_id):
+    """Every bucket's exact count from the persisted tallies, for views that
+    must not show the bounded in-process sketch (the results page)."""
+    return dict(db.session.execute(
+        select(QuestionTally.bucket, QuestionTally.count)
+        .where(QuestionTally.question_id == question_id, QuestionTally.count > 0)).all())
+
+
+def _build(question):
+    """Tally a question's existing responses and persist the result.
+
+    Runs once per question (first read or write after it was created, or
+    after an upgrade from a release without aggregates) and commits on its
+    own, so callers must not have pending changes.
+    """
+    counts, weights, total = Counter(), Counter(), 0
+    for value, n in value_counts(question.id):
+        total += n
+        for bucket, weight in _contributions(question, value):
+            counts[bucket] += n
+            weights[bucket] += weight * n
+    db.session.add(QuestionAggregate(question_id=question.id, total_responses=total, version=0))
+    db.session.add_all(QuestionTally(question_id=question.id, bucket=b,
+                                     count=counts[b], weight=weights[b]) for b in counts)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request built it first; theirs is as good as ours.
+        db.session.rollback()
+        return _load(question.id)
+    return Tallies(0, total, counts, weights)
+
+
+def tallies(question):
+    """Current tallies for `question`, building them on first use. Word-cloud
+    questions get a bounded sketch when WORD_CLOUD_TOP_K is set."""
+    cache = _cache()
+    t = cache.get(question.id)
+    if t is None:
+        capacity = _capacity(question)
+        t = _load(question.id, capacity) or _build(question).bounded(capacity)
+        cache.put(question.id, t)
+        cache.with_unwritten(question.id, t)
+    return t
+
+
+def tallies_for(questions):
+    """{question_id: Tallies} for many questions at once, as tallies() would
+    return them. Whatever isn't cached is read in two queries for the lot
+    rather than two per question."""
+    cache = _cache()
+    found, missing = {}, []
+    for question in questions:
+        t = cache.get(question.id)
+        if t is None:
+            missing.append(question)
+        else:
+            found[question.id] = t
+    if not missing:
+        return found
+    loaded = {qid: Tallies(version, total) for qid, version, total in db.session.execute(
+        select(QuestionAggregate.question_id, QuestionAggregate.version,
+               QuestionAggregate.total_responses)
+        .where(QuestionAggregate.question_id.in_([q.id for q in missing])))}
+    if loaded:
+        for qid, bucket, count, weight in db.session.execute(
+                select(QuestionTally.question_id, QuestionTally.bucket,
+                       QuestionTally.count, QuestionTally.weight)
+                .where(QuestionTally.question_id.in_(list(loaded)))):
+            loaded[qid].counts[bucket] = count
+            loaded[qid].weights[bucket] = weight
+    for question in missing:
+        t = loaded.get(question.id) or _build(question)
+        t = t.bounded(_capacity(question))
+        cache.put(question.id, t)
+        found[question.id] = cache.with_unwritten(question.id, t)
+    return found
+
+
+def lock_for_write(question):
+    """Take `question`'s write lock for the rest of the transaction.
+
+    Call before reading the answer a write will replace, so two writes from
+    the same respondent can't both see the same previous answer (and count
+    it twice): the no-op UPDATE row-locks the aggregate on PostgreSQL and
+    takes the write lock on SQLite. Builds the aggregate first if needed.
+    """
+    tallies(question)
+    db.session.execute(
+        update(QuestionAggregate).where(QuestionAggregate.question_id == question.id)
+        .values(version=QuestionAggregate.version))
+
+
+def record_response(question, old_value, new_value):
+    """Adjust `question`'s tallies for one response write.
+
+    Call before changing the Response row, inside the same transaction:
+    `old_value` is the answer being replaced (None for a first answer), read
+    after lock_for_write. The persisted rows change now; the in-process copy
+    once the caller commits.
+    """
+    tallies(question)  # the diff below assumes the aggregate exists
+    qid = question.id
+    total_delta, diff = response_diff(question, old_value, new_value)
+    # Bumping the version first also takes the row lock, serialising writers
+    # per question so the tally upserts below can't race each other.
+    db.session.execute(
+        update(QuestionAggregate).where(QuestionAggregate.question_id == qid)
+        .values(total_responses=QuestionAggregate.total_responses + total_delta,
+                version=QuestionAggregate.version + 1))
+    version = db.session.execute(
+        select(QuestionAggregate.version)
+        .where(QuestionAggregate.question_id == qid)).scalar_one()
+    for bucket, (count, weight) in diff.items():
+        result = db.session.execute(
+            update(QuestionTally)
+            .where(QuestionTally.question_id == qid, QuestionTally.bucket == bucket)
+            .values(count=QuestionTally.count + count, weight=QuestionTally.weight + weight))
+        if result.rowcount == 0:
+            db.session.execute(insert(QuestionTally).values(
+                question_id=qid, bucket=bucket, count=count, weight=weight))
+    db.session.info.setdefault(_PENDING_KEY, []).append(
+        (_cache(), qid, version, total_delta, diff))
+
+
+def hold_unwritten(question_id, total_delta, diff):
+    """Count a response diff in live tallies before it's written. Once the
+    write is in the transaction, release_unwritten_on_commit hands it over to
+    the committed tallies; release_unwritten drops it if it's abandoned."""
+    _cache().hold(question_id, total_delta, diff, 1)
+
+
+def release_unwritten(question_id, total_delta, diff):
+    _cache().hold(question_id, total_delta, diff, -1)
+
+
+def release_unwritten_on_commit(question_id, total_delta, diff):
+    """Release a held diff as the current transaction commits — atomically
+    with its write reaching the in-process tallies. Kept held if it rolls
+    back."""
+    db.session.info.setdefault(_RELEASE_KEY, []).append(
+        (_cache(), question_id, total_delta, diff))
+
+
+def delete_for_questions(question_ids):
+    """Remove aggregates for questions about to be deleted. No commit."""
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    QuestionTally.query.filter(QuestionTally.question_id.in_(question_ids)) \
+        .delete(synchronize_session=False)
+    QuestionAggregate.query.filter(QuestionAggregate.question_id.in_(question_ids)) \
+        .delete(synchronize_session=False)
+    _cache().discard(question_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_committed(session):
+    committed = session.info.pop(_PENDING_KEY, ())
+    released = session.info.pop(_RELEASE_KEY, ())
+    for cache in {entry[0] for entry in (*committed, *released)}:
+        cache.publish([entry[1:] for entry in committed if entry[0] is cache],
+                      [entry[1:] for entry in released if entry[0] is cache])
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _drop_rolled_back(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_RELEASE_KEY, None)
+
+
+def init_app(app):
+    app.extensions[_EXTENSION_KEY] = _TallyCache(app.config['AGGREGATE_CACHE_SIZE'])
@@ -6,19 +6,19 @@ one of the question's options, free-text answers are length-capped, and the
 respondent cookie must be a well-formed UUID.
 """
 
-import json
+import re
 import uuid
 
 from flask import (
-    flash, jsonify, make_response, redirect, render_template, request, url_for
+    abort, flash, jsonify, make_response, redirect, render_template, request, url_for
 )
+from sqlalchemy.orm import joinedload
 
-from .extensions import limiter
-from .extensions import db
-from .models import Question, Response, Session
-from .models import utcnow_iso
-from .sockets import broadcast_results
-from .utils import normalize_session_code, session_code_match
+from .extensions import db, limiter
+from .models import Question, Response
+from .questions import compiled_options
+from .responses import submit_response, submit_responses
+from .utils import live_session_by_code, normalize_session_code
 
 RESPONDENT_COOKIE_NAME = "classpulse_respondent"
 
@@ -38,127 +38,133 @@ def _valid_respondent_id(value):
         return None
 
 
-def _question_options(question):
-    try:
-        parsed = json.loads(question.options) if question.options else []
-    except (json.JSONDecodeError, TypeError):
-        parsed = []
-    return parsed
+# Form fields that carry an answer to question <id>, as the per-question
+# forms name them: response-<id>, response-<id>-other, rank-<id>-<n>.
+_ANSWER_FIELD = re.compile(r'^(?:response-(\d+)(?:-other)?|rank-(\d+)-\d+)$')
 
 
-def _extract_response_value(question):
-    """Validate the submitted form against the question definition.
+def _answered_question_ids():
+    """Ids of the questions the submitted form carries an answer field for."""
+    ids = set()
+    for name in request.form:
+        m = _ANSWER_FIELD.match(name)
+        if m:
+            ids.add(int(m.group(1) or m.group(2)))
+    return ids
 
-    Returns (response_value, error_message). Exactly one is non-None.
-    """
-    q_type = question.type
-    field = f'response-{question.id}'
-
-    if q_type == 'multiple_choice':
-        options = [str(o) for o in _question_options(question)]
-        chosen = request.form.get(field)
-        if chosen is None:
-            return None, "No response value submitted."
-        if chosen not in options:
-            return None, "Please choose one of the listed options."
-        return chosen, None
-
-    if q_type == 'multi_select':
-        options = [str(o) for o in _question_options(question)]
-        chosen = [v for v in request.form.getlist(field) if v.strip()]
-        if not chosen:
-            return None, "Please select at least one option."
-        if any(v not in options for v in chosen):
-            return None, "Please choose from the listed options."
-        # Dedupe while preserving order.
-        return "\n".join(dict.fromkeys(chosen)), None
-
-    if q_type == 'ranking':
-        opts = [str(o) for o in _question_options(question)]
-        assigned, ok = {}, True
-        for idx, opt in enumerate(opts):
-            raw_rank = request.form.get(f'rank-{question.id}-{idx}')
-            try:
-                assigned[opt] = int(raw_rank)
-            except (TypeError, ValueError):
-                ok = False
-        if not ok or sorted(assigned.values()) != list(range(1, len(opts) + 1)):
-            return None, "Assign a unique rank (1–N) to every option."
-        ordered = [o for o, _ in sorted(assigned.items(),
-                                        key=lambda kv: (kv[1], opts.index(kv[0])))]
-        return "\n".join(ordered), None
-
-    if q_type == 'multiple_choice_other':
-        options = [str(o) for o in _question_options(question)]
-        chosen = request.form.get(field)
-        if chosen == '__other__':
-            other = request.form.get(f'{field}-other', '').strip()
-            if not other:
-                return None, "Please enter your 'Other' answer."
-            if len(other) > MAX_OTHER_LEN:
-                return None, f"'Other' answers are limited to {MAX_OTHER_LEN} characters."
-            return other, None
-        if chosen is None:
-            return None, "No response value submitted."
-        if chosen not in options:
-            return None, "Please choose one of the listed options."
-        return chosen, None
-
-    if q_type == 'rating':
-        try:
-            config = json.loads(question.options) if question.options else {}
-            max_rating = int(config.get('max_rating', 5))
-        except (json.JSONDecodeError, AttributeError, ValueError, TypeError):
-            max_rating = 5
-        raw = request.form.get(field)
-        try:
-            rating = int(raw)
-        except (TypeError, ValueError):
-            return None, "Please choose a rating."
-        if not 1 <= rating <= max_rating:
-            return None, f"Rating must be between 1 and {max_rating}."
-        return str(rating), None
 
-    if q_type == 'numeric':
-        raw = request.form.get(field)
+def _validate_choice(question, compiled, field, what="options"):
+    chosen = request.form.get(field)
+    if chosen is None:
+        return None, "No response value submitted."
+    if chosen not in compiled.label_set:
+        return None, f"Please choose one of the listed {what}."
+    return chosen, None
+
+
+def _validate_image_choice(question, compiled, field):
+    return _validate_choice(question, compiled, field, what="images")
+
+
+def _validate_multi_select(question, compiled, field):
+    chosen = [v for v in request.form.getlist(field) if v.strip()]
+    if not chosen:
+        return None, "Please select at least one option."
+    if any(v not in compiled.label_set for v in chosen):
+        return None, "Please choose from the listed options."
+    # Dedupe while preserving order.
+    return "\n".join(dict.fromkeys(chosen)), None
+
+
+def _validate_ranking(question, compiled, field):
+    # Ranks arrive per option position; a valid answer is a permutation of
+    # 1..N, so each option drops straight into its slot — no sort.
+    labels = compiled.labels
+    ranks = []
+    for idx in range(len(labels)):
         try:
-            value = float(raw)
+            ranks.append(int(request.form.get(f'rank-{question.id}-{idx}')))
         except (TypeError, ValueError):
-            return None, "Please enter a valid number."
-        cfg = _question_options(question)
-        if isinstance(cfg, dict):
-            try:
-                if 'min' in cfg and value < float(cfg['min']):
-                    return None, f"Value must be at least {cfg['min']}."
-                if 'max' in cfg and value > float(cfg['max']):
-                    return None, f"Value must be at most {cfg['max']}."
-            except (ValueError, TypeError):
-                pass
-        return raw.strip(), None
-
-    if q_type == 'image_choice':
-        items = _question_options(question)
-        labels = [str(it.get('label', '')) for it in items] if isinstance(items, list) else []
-        chosen = request.form.get(field)
-        if chosen is None:
-            return None, "No response value submitted."
-        if chosen not in labels:
-            return None, "Please choose one of the listed images."
-        return chosen, None
-
-    # word_cloud, short_answer: free text with length caps.
+            return None, "Assign a unique rank (1–N) to every option."
+    if len(ranks) != len(compiled.rank_set) or set(ranks) != compiled.rank_set:
+        return None, "Assign a unique rank (1–N) to every option."
+    ordered = [None] * len(labels)
+    for label, rank in zip(labels, ranks):
+        ordered[rank - 1] = label
+    return "\n".join(ordered), None
+
+
+def _validate_choice_other(question, compiled, field):
+    if request.form.get(field) == '__other__':
+        other = request.form.get(f'{field}-other', '').strip()
+        if not other:
+            return None, "Please enter your 'Other' answer."
+        if len(other) > MAX_OTHER_LEN:
+            return None, f"'Other' answers are limited to {MAX_OTHER_LEN} characters."
+        return other, None
+    return _validate_choice(question, compiled, field)
+
+
+def _validate_rating(question, compiled, field):
+    max_rating = compiled.max_rating
+    try:
+        rating = int(request.form.get(field))
+    except (TypeError, ValueError):
+        return None, "Please choose a rating."
+    if not 1 <= rating <= max_rating:
+        return None, f"Rating must be between 1 and {max_rating}."
+    return str(rating), None
+
+
+def _validate_numeric(question, compiled, field):
+    raw = request.form.get(field)
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        return None, "Please enter a valid number."
+    if compiled.minimum is not None and value < compiled.minimum:
+        return None, f"Value must be at least {compiled.parsed['min']}."
+    if compiled.maximum is not None and value > compiled.maximum:
+        return None, f"Value must be at most {compiled.parsed['max']}."
+    return raw.strip(), None
+
+
+def _validate_text(question, compiled, field):
+    """word_cloud, short_answer: free text with length caps."""
     raw = request.form.get(field)
     if raw is None:
         return None, "No response value submitted."
     text = raw.strip()
     if not text:
         return None, "Please enter an answer."
-    cap = MAX_WORD_CLOUD_LEN if q_type == 'word_cloud' else MAX_SHORT_ANSWER_LEN
+    cap = MAX_WORD_CLOUD_LEN if question.type == 'word_cloud' else MAX_SHORT_ANSWER_LEN
     if len(text) > cap:
         return None, f"Answers are limited to {cap} characters."
     return text, None
 
 
+_VALIDATORS = {
+    'multiple_choice': _validate_choice,
+    'multi_select': _validate_multi_select,
+    'ranking': _validate_ranking,
+    'multiple_choice_other': _validate_choice_other,
+    'rating': _validate_rating,
+    'numeric': _validate_numeric,
+    'image_choice': _validate_image_choice,
+}
+
+
+def _extract_response_value(question):
+    """Validate the submitted form against the question definition.
+
+    Returns (response_value, error_message). Exactly one is non-None. The
+    checks run against the question's cached CompiledOptions (set lookups,
+    float bounds), so an answer's cost doesn't grow with the option count.
+    """
+    validate = _VALIDATORS.get(question.type, _validate_text)
+    return validate(question, compiled_options(question), f'response-{question.id}')
+
+
 def init_app(app):
 
     def _with_respondent_cookie(response, respondent_id):
@@ -182,9 +188,7 @@ def init_app(app):
             code = normalize_session_code(request.form.get('code'))
             current_session = None
             if len(code) == 6 and code.isalnum():
-                current_session = Session.query.filter(
-                    session_code_match(code), Session.active.is_(True),
-                    Session.archived.is_(False), Session.deleted.is_(False)).first()
+                current_session = live_session_by_code(code)
 
             if current_session:
                 respondent_id = _valid_respondent_id(
@@ -205,9 +209,7 @@ def init_app(app):
 
     @app.route('/audience/<code>')
     def audience_view(code):
-        current_session = Session.query.filter(
-            session_code_match(code), Session.active.is_(True),
-            Session.archived.is_(False), Session.deleted.is_(False)).first()
+        current_session = live_session_by_code(code)
         if not current_session:
             flash("Session not found, is inactive, archived, or has been deleted.", "warning")
             return redirect(url_for('join'))
@@ -239,7 +241,11 @@ def init_app(app):
         # Audience view submits via fetch() with this header; fall back to the
         # classic redirect/flash flow for non-JS clients.
         wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
-        question = Question.query.get_or_404(question_id)
+        # The session comes in the same SELECT: every check below reads it.
+        question = db.session.get(Question, question_id,
+                                  options=[joinedload(Question.session)])
+        if question is None:
+            abort(404)
         if (not question.active or not question.session.active
                 or question.session.archived or question.session.deleted):
             msg = "Sorry, this question or session is no longer active."
@@ -263,27 +269,9 @@ def init_app(app):
             flash(err_msg, "warning")
             return redirect(url_for('audience_view', code=question.session.code))
 
-        # Check for existing response and update, or create new
-        existing_response = Response.query.filter_by(
-            question_id=question_id,
-            respondent_id=respondent_id
-        ).first()
-
-        if existing_response:
-            existing_response.response_value = response_value
-            existing_response.created_at = utcnow_iso()
-        else:
-            db.session.add(Response(
-                question_id=question_id,
-                session_id=question.session_id,
-                response_value=response_value,
-                respondent_id=respondent_id,
-            ))
-
-        db.session.commit()
-
-        # Notify presenters via WebSocket
-        broadcast_results(question_id)
+        # Writes (or, with write-behind on, queues) the answer and notifies
+        # presenters via WebSocket.
+        submit_response(question, respondent_id, response_value)
 
         if wants_json:
             return jsonify({
@@ -293,3 +281,62 @@ def init_app(app):
             })
         flash("Your response was submitted!", "success")
         return redirect(url_for('audience_view', code=question.session.code))
+
+    @app.route('/audience/<code>/respond', methods=['POST'])
+    @limiter.limit("60 per minute")
+    def process_responses(code):
+        """Answer several of a session's active questions in one request.
+
+        Takes the same fields as process_response for each question. Valid
+        answers are stored in one transaction even if others are rejected;
+        the JSON reply carries a result per question id.
+        """
+        wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        current_session = live_session_by_code(code)
+        if not current_session:
+            msg = "Sorry, this session is no longer active."
+            if wants_json:
+                return jsonify({"success": False, "message": msg, "inactive": True}), 409
+            flash(msg, "warning")
+            return redirect(url_for('join'))
+
+        respondent_id = _valid_respondent_id(request.cookies.get(RESPONDENT_COOKIE_NAME))
+        if not respondent_id:
+            msg = "Could not identify you. Please try rejoining the session."
+            if wants_json:
+                return jsonify({"success": False, "message": msg, "needs_rejoin": True}), 400
+            flash(msg, "warning")
+            return redirect(url_for('join'))
+
+        submitted = _answered_question_ids()
+        active = {q.id: q for q in current_session.questions if q.active}
+        results, answers = {}, []
+        for question_id in sorted(submitted):
+            question = active.get(question_id)
+            if question is None:
+                results[question_id] = {
+                    "success": False, "inactive": True,
+                    "message": "Sorry, this question is no longer active."}
+                continue
+            response_value, err_msg = _extract_response_value(question)
+            if err_msg:
+                results[question_id] = {"success": False, "message": err_msg}
+                continue
+            answers.append((question, response_value))
+            results[question_id] = {"success": True, "response_value": response_value,
+                                    "message": "Your response was submitted!"}
+
+        if answers:
+            submit_responses(answers, respondent_id)
+        saved = len(answers)
+        if not submitted:
+            msg = "No answers submitted."
+        elif saved == len(submitted):
+            msg = "Your responses were submitted!"
+        else:
+            msg = f"{saved} of {len(submitted)} answers were submitted."
+        if wants_json:
+            return jsonify({"success": saved == len(submitted) > 0, "message": msg,
+                            "results": results}), (200 if saved else 400)
+        flash(msg, "success" if saved == len(submitted) > 0 else "warning")
+        return redirect(url_for('audience_view', code=current_session.code))
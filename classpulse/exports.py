@@ -0,0 +1,264 @@
+"""Streaming response exports: CSV (long or wide), NDJSON and (optionally)
+Parquet.
+
+Exports can cover a whole session's answers, so nothing here materialises
+them: rows are read a chunk at a time and written to the client as they
+come, keeping memory flat whatever the size and getting the first byte out
+at once. On PostgreSQL a chunk is a fetch from a server-side cursor; other
+databases (SQLite) are paged by keyset instead — each page its own short
+query — so a slow download never holds a read transaction open against
+the writers.
+
+CSV mirrors the stored rows; "wide" CSV pivots them to a row per
+respondent and a column per question, in the same single pass. NDJSON and
+Parquet are for analysis: each record also carries the question type,
+multi_select/ranking answers exploded into a list (`values`) and
+rating/numeric answers as a float (`number`). Parquet needs pyarrow, an
+optional extra (`pip install classpulse[export]`); without it only that
+format is off.
+"""
+
+import csv
+import functools
+import io
+import json
+import math
+
+from flask import Response as HTTPResponse, stream_with_context
+from sqlalchemy import func, select, tuple_
+
+from .extensions import db
+from .models import Response
+from .utils import csv_safe
+
+# Rows fetched (and written out) per round trip.
+EXPORT_CHUNK_ROWS = 1000
+
+# ?format= values, with their file extension and media type.
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'wide': ('csv', 'text/csv'),  # a row per respondent, a column per question
+}
+
+# Stored as newline-joined option labels.
+_LIST_VALUE_TYPES = ('multi_select', 'ranking')
+_NUMBER_VALUE_TYPES = ('rating', 'numeric')
+
+CSV_FIELDS = ("response_id", "question_id", "session_id",
+              "response_value", "respondent_id", "timestamp")
+
+_COLUMNS = (Response.id, Response.question_id, Response.session_id,
+            Response.response_value, Response.respondent_id, Response.created_at)
+
+
+def has_responses(*criteria) -> bool:
+    return db.session.execute(
+        select(Response.id).where(*criteria).limit(1)).first() is not None
+
+
+def _sort_keys(order):
+    # Each order is total (a respondent answers a question once; otherwise
+    # the primary key breaks ties), so a keyset page resumes exactly.
+    # created_at is NULL-safe: legacy rows may lack it.
+    if order == 'respondent':
+        return [Response.respondent_id, Response.question_id]
+    keys = [func.coalesce(Response.created_at, ''), Response.id]
+    return [Response.question_id] + keys if order == 'question' else keys
+
+
+def iter_responses(*criteria, order='time'):
+    """Yield lists of response rows (id, question_id, session_id,
+    response_value, respondent_id, created_at) matching `criteria`, in
+    chronological order — per question first if `order` is 'question'; by
+    respondent, then question, if it's 'respondent'."""
+    keys = _sort_keys(order)
+    query = select(*_COLUMNS).where(*criteria).order_by(*keys)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        yield from result.partitions()
+        return
+    key_query = select(*_COLUMNS, *keys).where(*criteria).order_by(*keys)
+    after = None
+    while True:
+        page_query = key_query if after is None else key_query.where(tuple_(*keys) > after)
+        page = db.session.execute(page_query.limit(EXPORT_CHUNK_ROWS)).all()
+        db.session.rollback()  # end the read between pages
+        if not page:
+            return
+        yield [row[:len(_COLUMNS)] for row in page]
+        if len(page) < EXPORT_CHUNK_ROWS:
+            return
+        after = tuple_(*page[-1][len(_COLUMNS):])
+
+
+def _csv_chunks(chunks):
+    """The CSV text a chunk of rows at a time. response_value is
+    audience-controlled, so it goes through csv_safe() to neutralise
+    spreadsheet formula injection."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for rows in chunks:
+        for rid, qid, sid, value, respondent_id, created_at in rows:
+            writer.writerow((rid, qid, sid, csv_safe(value), respondent_id, created_at))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _wide_csv_chunks(chunks, questions):
+    """One CSV row per respondent and a column per question, in a single
+    pass over rows ordered by respondent: only the row being filled is held.
+    Cells are csv_safe()d like the long CSV's."""
+    column = {q.id: i for i, q in enumerate(questions)}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['respondent_id'] + [csv_safe(f'Q{i}: {q.title}')
+                                         for i, q in enumerate(questions, 1)])
+    respondent, cells = None, None
+    for rows in chunks:
+        for _, qid, _, value, respondent_id, _ in rows:
+            if qid not in column:
+                continue
+            if respondent_id != respondent:
+                if respondent is not None:
+                    writer.writerow([respondent] + cells)
+                respondent, cells = respondent_id, [''] * len(questions)
+            cells[column[qid]] = csv_safe(value)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if respondent is not None:
+        writer.writerow([respondent] + cells)
+    yield buffer.getvalue()
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _records(rows, question_types):
+    """Rows as typed export records (see the module docstring)."""
+    for rid, qid, sid, value, respondent_id, created_at in rows:
+        q_type = question_types.get(qid)
+        yield {
+            'response_id': rid, 'question_id': qid, 'session_id': sid,
+            'question_type': q_type, 'respondent_id': respondent_id,
+            'timestamp': created_at, 'response_value': value,
+            'values': value.split('\n') if q_type in _LIST_VALUE_TYPES else None,
+            'number': _number(value) if q_type in _NUMBER_VALUE_TYPES else None,
+        }
+
+
+def _ndjson_chunks(chunks, question_types):
+    for rows in chunks:
+        yield ''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                      for record in _records(rows, question_types))
+
+
+@functools.lru_cache(maxsize=None)
+def _pyarrow():
+    """(pyarrow, pyarrow.parquet), or None when the optional extra is absent."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_available() -> bool:
+    return _pyarrow() is not None
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands back whatever was written since the
+    last take(), so a Parquet file can go out a row group at a time."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts, self._written = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def take(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def _parquet_chunks(chunks, question_types):
+    pa, pq = _pyarrow()
+    schema = pa.schema([
+        ('response_id', pa.int64()), ('question_id', pa.int64()),
+        ('session_id', pa.int64()), ('question_type', pa.string()),
+        ('respondent_id', pa.string()), ('timestamp', pa.string()),
+        ('response_value', pa.string()), ('values', pa.list_(pa.string())),
+        ('number', pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    wrote = False
+    for rows in chunks:
+        # One row group per chunk.
+        writer.write_table(pa.Table.from_pylist(list(_records(rows, question_types)),
+                                                schema=schema))
+        wrote = True
+        yield sink.take()
+    if not wrote:
+        writer.write_table(schema.empty_table())
+    writer.close()
+    yield sink.take()
+
+
+def stream_download(chunks, filename, mimetype):
+    """A streamed attachment response over an iterator of text or bytes."""
+    def generate():
+        for chunk in chunks:
+            yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+    return HTTPResponse(stream_with_context(generate()), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def responses_export(fmt, *criteria, filename_stem, questions, by_question=False):
+    """Stream the responses matching `criteria` as a `fmt` download (a key of
+    EXPORT_FORMATS; check parquet_available() first). `questions` are the
+    exported questions in display order: the typed formats need their types,
+    the wide one its columns."""
+    if fmt == 'wide':
+        body = _wide_csv_chunks(iter_responses(*criteria, order='respondent'), questions)
+        filename_stem = f'{filename_stem}_wide'
+    else:
+        chunks = iter_responses(*criteria, order='question' if by_question else 'time')
+        question_types = {q.id: q.type for q in questions}
+        if fmt == 'ndjson':
+            body = _ndjson_chunks(chunks, question_types)
+        elif fmt == 'parquet':
+            body = _parquet_chunks(chunks, question_types)
+        else:
+            body = _csv_chunks(chunks)
+    extension, mimetype = EXPORT_FORMATS[fmt]
+    return stream_download(body, f'{filename_stem}.{extension}', mimetype)
+
+
+def init_app(app):
+    @app.context_processor
+    def _export_formats():
+        return {'parquet_export_available': parquet_available()}
@@ -1,8 +1,22 @@
 import uuid
 from datetime import datetime, timedelta, timezone
 
+from sqlalchemy.orm import validates
+
 from .extensions import db
 
+# Folded out of session codes before they're compared (see utils). Lets
+# someone who types O for 0 in anyway, and keeps codes issued before the
+# alphabet was narrowed (which really can contain O/I/L) working.
+_CODE_CONFUSABLES = {'O': '0', 'I': '1', 'L': '1'}
+
+
+def normalize_session_code(raw) -> str:
+    """Upper-case a typed session code and fold confusable glyphs onto the
+    canonical alphabet."""
+    return ''.join(_CODE_CONFUSABLES.get(ch, ch)
+                   for ch in (raw or '').strip().upper())
+
 
 def utcnow_iso() -> str:
     """Current UTC time as a timezone-aware ISO-8601 string.
@@ -44,6 +58,10 @@ class User(db.Model):
 class Session(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(6), unique=True, nullable=False)
+    # normalize_session_code(code), kept in step by the validator below so a
+    # typed code resolves through an index. Nullable for the additive
+    # migration, which backfills it (see _backfill_session_codes).
+    code_normalized = db.Column(db.String(6), nullable=True)
     name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.String, default=utcnow_iso)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -58,6 +76,18 @@ class Session(db.Model):
     responses = db.relationship('Response', backref='session', lazy=True)
     proposals = db.relationship('Proposal', backref='session', lazy=True)
 
+    __table_args__ = (
+        # The dashboard lists a user's non-deleted sessions.
+        db.Index('ix_session_user_deleted', 'user_id', 'deleted'),
+        # Codes differing only by O/0 or I/L/1 are the same code to a typist.
+        db.Index('uq_session_code_normalized', 'code_normalized', unique=True),
+    )
+
+    @validates('code')
+    def _normalize_code(self, key, code):
+        self.code_normalized = normalize_session_code(code)
+        return code
+
     @property
     def is_live(self) -> bool:
         """Visible/joinable by the audience."""
@@ -74,6 +104,7 @@ class Question(db.Model):
     created_at = db.Column(db.String, default=utcnow_iso)
     order = db.Column(db.Integer, default=0)
     responses = db.relationship('Response', backref='question', lazy=True)
+    __table_args__ = (db.Index('ix_question_session', 'session_id'),)
 
 
 class Response(db.Model):
@@ -83,6 +114,49 @@ class Response(db.Model):
     response_value = db.Column(db.Text, nullable=False)
     respondent_id = db.Column(db.String(36), nullable=False)  # anonymous UUID
     created_at = db.Column(db.String, default=utcnow_iso)
+    __table_args__ = (
+        # One answer per respondent per question; submissions upsert against
+        # it, and it also serves every lookup by question_id alone. A unique
+        # index rather than a constraint so existing databases can gain it
+        # without a table rebuild (see _apply_response_uniqueness).
+        db.Index('uq_response_question_respondent', 'question_id', 'respondent_id',
+                 unique=True),
+        # A question's answers newest first (short-answer feed, exports).
+        db.Index('ix_response_question_created', 'question_id', 'created_at'),
+        # An audience member's previous answers in a session.
+        db.Index('ix_response_session_respondent', 'session_id', 'respondent_id'),
+    )
+
+
+class QuestionAggregate(db.Model):
+    """Running totals for one question's results (see aggregates.py).
+
+    Adjusted in the same transaction as every Response write, so live stats
+    never rescan the responses table. Its presence marks the question's
+    QuestionTally rows as built; `version` is bumped on every write.
+    """
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    total_responses = db.Column(db.Integer, default=0, nullable=False)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+
+class QuestionTally(db.Model):
+    """One counter in a question's aggregate: an option label, a rating, a
+    ranked option (whose `weight` accumulates the positions it was given)."""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    bucket = db.Column(db.Text, primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    weight = db.Column(db.Float, default=0, nullable=False)
+
+
+class SessionSnapshot(db.Model):
+    """An archived session's results, frozen (see snapshots.py): the
+    {question_id: stats} its results views would compute, as zlib-compressed
+    JSON. Archived sessions take no more answers, so this never goes stale;
+    it's dropped on unarchive."""
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), primary_key=True)
+    stats = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.String, default=utcnow_iso)
 
 
 # Statuses a Proposal moves through. Flagged proposals are hidden from the
@@ -107,6 +181,7 @@ class Proposal(db.Model):
     created_at = db.Column(db.String, default=utcnow_iso)
     votes = db.relationship('ProposalVote', backref='proposal', lazy=True,
                             cascade='all, delete-orphan')
+    __table_args__ = (db.Index('ix_proposal_session_status', 'session_id', 'status'),)
 
 
 class ProposalVote(db.Model):
@@ -115,6 +190,7 @@ class ProposalVote(db.Model):
     proposal_id = db.Column(db.Integer, db.ForeignKey('proposal.id'), nullable=False)
     respondent_id = db.Column(db.String(36), nullable=False)
     created_at = db.Column(db.String, default=utcnow_iso)
+    # Also serves lookups by proposal_id alone (a vote count, say).
     __table_args__ = (db.UniqueConstraint('proposal_id', 'respondent_id',
                                           name='uq_vote_proposal_respondent'),)
 
@@ -140,6 +216,7 @@ class EmailCode(db.Model):
     expires_at = db.Column(db.String, nullable=False)  # ISO-8601 UTC
     used = db.Column(db.Boolean, default=False, nullable=False)
     user = db.relationship('User', lazy=True)
+    __table_args__ = (db.Index('ix_email_code_user_purpose', 'user_id', 'purpose', 'used'),)
 
     @staticmethod
     def expiry_iso(ttl_minutes: int) -> str:
@@ -23,7 +23,7 @@ from flask import current_app
 
 from . import ai
 from .models import Proposal
-from .stats import STOP_WORDS
+from .words import STOP_WORDS
 
 # Unambiguous profanity/slurs only — subject terms that could appear in a real
 # lesson (anatomy, drugs, war, ...) deliberately stay off this list; the LLM
@@ -1,24 +1,30 @@
 """Presenter-facing pages and the session/question authoring API."""
 
-import csv
-import io
 import json
 
 from flask import (
-    abort, flash, jsonify, redirect, render_template, request, send_file,
-    session, url_for
+    abort, flash, jsonify, redirect, render_template, request, session, url_for
 )
 
 from .accounts import purge_session
+from .aggregates import WORD_TYPES, delete_for_questions
 from .ai import generate_question_with_ai
 from .auth import login_required
+from .exports import EXPORT_FORMATS, has_responses, parquet_available, responses_export
 from .extensions import db, limiter
 from .models import Question, Response, Session
+from .qr import qr_image_url
 from .questions import (
-    parse_question_payload, question_to_dict, session_to_dict
+    forget_compiled_options, parse_question_payload, question_counts, question_to_dict,
+    questions_to_dicts, session_to_dict,
 )
+from .snapshots import freeze_session, frozen_question_stats, session_stats, thaw_session
 from .sockets import broadcast_questions_changed
-from .utils import create_qr_code_data, csv_safe, generate_session_code
+from .utils import forget_session_code, generate_session_code
+
+
+# Upper bound on ?limit= for the short-answer feed.
+MAX_ANSWERS_PAGE = 500
 
 
 def _owned_session_or_404(session_id):
@@ -33,40 +39,19 @@ def _render_dashboard(selected_id=None):
     # Include archived (client filters via the Active/Archived tabs); exclude deleted.
     user_sessions = Session.query.filter_by(user_id=user_id, deleted=False) \
         .order_by(Session.created_at.desc()).all()
-    sessions_data = [session_to_dict(s) for s in user_sessions]
+    counts = question_counts(s.id for s in user_sessions)
+    sessions_data = [session_to_dict(s, question_count=counts.get(s.id, 0))
+                     for s in user_sessions]
     selected = None
     if selected_id is not None:
         sel = next((s for s in user_sessions if s.id == selected_id), None)
         if sel:
             selected = session_to_dict(sel, include_questions=True)
             selected['join_url'] = url_for('audience_view', code=sel.code, _external=True)
-            selected['qr'] = create_qr_code_data(selected['join_url'])
+            selected['qr'] = qr_image_url(selected['join_url'])
     return render_template('dashboard.html', sessions=sessions_data, selected=selected)
 
 
-def _send_responses_csv(responses, filename):
-    """Stream a list of Response rows as a CSV download.
-
-    response_value is audience-controlled, so it goes through csv_safe() to
-    neutralise spreadsheet formula injection.
-    """
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=[
-        "response_id", "question_id", "session_id",
-        "response_value", "respondent_id", "timestamp",
-    ])
-    writer.writeheader()
-    for r in responses:
-        writer.writerow({
-            "response_id": r.id, "question_id": r.question_id, "session_id": r.session_id,
-            "response_value": csv_safe(r.response_value), "respondent_id": r.respondent_id,
-            "timestamp": r.created_at,
-        })
-    mem_output = io.BytesIO(output.getvalue().encode('utf-8'))
-    output.close()
-    return send_file(mem_output, as_attachment=True, download_name=filename, mimetype='text/csv')
-
-
 def init_app(app):
 
     # --- Pages ---
@@ -114,7 +99,7 @@ def init_app(app):
         active_questions = [q for q in current_session.questions if q.active]
         join_url = url_for('audience_view', code=current_session.code, _external=True)
         # Big enough to stay sharp when the join screen blows it up on a projector.
-        qr_code_data_url = create_qr_code_data(join_url, size=720)
+        qr_code_url = qr_image_url(join_url, size=720)
         # Shown as text next to the code, for anyone typing it in rather than scanning.
         manual_join_url = url_for('join', _external=True)
         return render_template('present_mode.html',
@@ -122,7 +107,7 @@ def init_app(app):
                                active_questions=active_questions,
                                join_url=join_url,
                                manual_join_url=manual_join_url,
-                               qr_code_data_url=qr_code_data_url,
+                               qr_code_url=qr_code_url,
                                mode='present')
 
     @app.route('/sessions/<int:session_id>/results')
@@ -138,9 +123,21 @@ def init_app(app):
                                current_session=current_session,
                                active_questions=list(current_session.questions),
                                join_url=None,
-                               qr_code_data_url=None,
+                               qr_code_url=None,
                                mode='results')
 
+    @app.route('/api/sessions/<int:session_id>/results')
+    @login_required
+    def api_session_results(session_id):
+        """Live stats for every question in the session in one response —
+        the HTTP twin of the 'join_session_results' socket event. Archived
+        sessions are served from their snapshot."""
+        s = _owned_session_or_404(session_id)
+        if s.deleted:
+            abort(404)
+        return jsonify({"success": True, "session_id": s.id,
+                        "results": session_stats(s)})
+
     @app.route('/questions/<int:question_id>/results')
     @login_required
     def view_question_results(question_id):
@@ -148,35 +145,73 @@ def init_app(app):
         question = Question.query.get_or_404(question_id)
         if question.session.user_id != session['user_id']:
             abort(403)
-        stats = get_question_stats(question_id)
+        # Archived: the frozen stats, except word clouds — this page shows
+        # every term, the snapshot only the top WORD_CLOUD_TOP_K.
+        stats = None if question.type in WORD_TYPES else frozen_question_stats(question)
+        if stats is None:
+            stats = get_question_stats(question_id, exact=True)
         return render_template('question_results.html', question=question, stats=stats)
 
+    @app.route('/questions/<int:question_id>/answers')
+    @login_required
+    def question_answers(question_id):
+        """Cursor-paged short answers: ?since=<cursor> for newer ones,
+        ?before=<cursor> to page back through older ones (see short_answers)."""
+        from .stats import short_answers
+        question = Question.query.get_or_404(question_id)
+        if question.session.user_id != session['user_id']:
+            abort(403)
+        if question.type != 'short_answer':
+            return jsonify({"success": False, "message": "Not a short answer question."}), 400
+        limit = request.args.get('limit', type=int)
+        page = short_answers(question_id, since=request.args.get('since'),
+                             before=request.args.get('before'),
+                             limit=min(limit, MAX_ANSWERS_PAGE) if limit else None)
+        return jsonify({"success": True, **page})
+
     # --- Exports ---
 
+    def _export_format():
+        """The ?format= of an export, or None (after flashing why) if it can't
+        be served."""
+        fmt = (request.args.get('format') or 'csv').lower()
+        if fmt not in EXPORT_FORMATS:
+            flash(f"Unknown export format '{fmt}'.", "warning")
+            return None
+        if fmt == 'parquet' and not parquet_available():
+            flash("Parquet export needs the optional pyarrow package on the server.", "warning")
+            return None
+        return fmt
+
     @app.route('/questions/<int:question_id>/export')
     @login_required
     def export_question_results(question_id):
-        question = Question.query.get_or_404(question_id)
+        question = db.get_or_404(Question, question_id)
         if question.session.user_id != session['user_id']:
             abort(403)
-        all_responses = Response.query.filter_by(question_id=question_id) \
-            .order_by(Response.created_at).all()
-        if not all_responses:
+        fmt = _export_format()
+        if fmt and not has_responses(Response.question_id == question_id):
             flash("No responses to export for this question.", "info")
+            fmt = None
+        if fmt is None:
             return redirect(url_for('view_question_results', question_id=question_id))
-        return _send_responses_csv(all_responses, f"classpulse_q_{question_id}_results.csv")
+        return responses_export(fmt, Response.question_id == question_id,
+                                filename_stem=f"classpulse_q_{question_id}_results",
+                                questions=[question])
 
     @app.route('/sessions/<int:session_id>/export')
     @login_required
     def export_session_results(session_id):
-        _owned_session_or_404(session_id)  # ownership check
-        all_responses = Response.query.filter_by(session_id=session_id) \
-            .order_by(Response.question_id, Response.created_at).all()
-        if not all_responses:
+        s = _owned_session_or_404(session_id)
+        fmt = _export_format()
+        if fmt and not has_responses(Response.session_id == session_id):
             flash("No responses to export for this session.", "info")
+            fmt = None
+        if fmt is None:
             return redirect(url_for('manage_session', session_id=session_id))
-        return _send_responses_csv(all_responses,
-                                   f"classpulse_session_{session_id}_all_results.csv")
+        return responses_export(fmt, Response.session_id == session_id, by_question=True,
+                                filename_stem=f"classpulse_session_{session_id}_all_results",
+                                questions=list(s.questions))
 
     # --- AI generation API ---
 
@@ -247,6 +282,7 @@ def init_app(app):
             return jsonify({"success": False, "message": "Cannot toggle deleted session."}), 400
         current_session.active = not current_session.active
         db.session.commit()
+        forget_session_code(current_session.code)
         # Notify audience members so an inactive session boots them out live
         broadcast_questions_changed(current_session.id)
         return jsonify({"success": True, "active": current_session.active,
@@ -263,8 +299,12 @@ def init_app(app):
         if current_session.archived:
             current_session.active = False
         db.session.commit()
+        forget_session_code(current_session.code)
         if current_session.archived:
+            freeze_session(current_session)
             broadcast_questions_changed(current_session.id)
+        else:
+            thaw_session(current_session.id)
         return jsonify({"success": True, "archived": current_session.archived,
                         "new_text": "Unarchive" if current_session.archived else "Archive"})
 
@@ -290,7 +330,7 @@ def init_app(app):
         s = _owned_session_or_404(session_id)
         if request.method == 'GET':
             return jsonify({"success": True,
-                            "questions": [question_to_dict(q) for q in s.questions]})
+                            "questions": questions_to_dicts(s.questions)})
         # POST: create
         if s.archived or s.deleted:
             return jsonify({"success": False,
@@ -348,6 +388,8 @@ def init_app(app):
                             "question": question_to_dict(q)})
         q.type, q.title, q.options = q_type, title, json.dumps(opts)
         db.session.commit()
+        if structural:
+            forget_compiled_options(q.id)
         return jsonify({"success": True, "question": question_to_dict(q)})
 
     @app.route('/api/questions/<int:question_id>/duplicate', methods=['POST'])
@@ -383,6 +425,7 @@ def init_app(app):
                            "Deactivate instead."
             }), 400
         session_id = question.session_id
+        delete_for_questions([question_id])
         db.session.delete(question)
         db.session.commit()
         # A deleted question may have been active; refresh audience views
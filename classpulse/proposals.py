@@ -14,7 +14,7 @@ from .models import Proposal, ProposalVote, Question, Session
 from .moderation import moderate_proposal
 from .questions import parse_question_payload, question_to_dict
 from .sockets import broadcast_proposals_changed, broadcast_questions_changed
-from .utils import session_code_match
+from .utils import live_session_by_code
 
 # Types the audience may propose. Deliberately narrower than
 # VALID_QUESTION_TYPES: no image_choice (anonymous users supplying image URLs
@@ -28,14 +28,6 @@ FLAGGED_MESSAGE = ("Based on this session's filters, your question needs present
                    "approval before it appears in the public list.")
 
 
-def _live_session_by_code(code):
-    # Must fold confusable glyphs exactly as the audience routes do, or a page
-    # reached via one spelling of a code would 404 its own proposals API.
-    return Session.query.filter(
-        session_code_match(code), Session.active.is_(True),
-        Session.archived.is_(False), Session.deleted.is_(False)).first()
-
-
 def proposal_to_dict(p, respondent_id=None):
     try:
         options = json.loads(p.options) if p.options else []
@@ -78,7 +70,7 @@ def init_app(app):
 
     @app.route('/audience/<code>/proposals', methods=['GET'])
     def audience_list_proposals(code):
-        s = _live_session_by_code(code)
+        s = live_session_by_code(code)
         if not s or not s.allow_proposals:
             return jsonify({"success": False, "enabled": False,
                             "message": "Proposals are not open for this session."}), 404
@@ -101,7 +93,7 @@ def init_app(app):
     @app.route('/audience/<code>/proposals', methods=['POST'])
     @limiter.limit("5 per minute")
     def audience_create_proposal(code):
-        s = _live_session_by_code(code)
+        s = live_session_by_code(code)
         if not s or not s.allow_proposals:
             return jsonify({"success": False,
                             "message": "Proposals are not open for this session."}), 404
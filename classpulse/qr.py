@@ -0,0 +1,133 @@
+"""Join-link QR codes, rendered once and served as cacheable images.
+
+A QR image is addressed by a digest of (url, size). Rendering a page only
+computes that digest and makes sure the PNG exists — in an in-process LRU,
+backed by files under the persisted instance/qr/ directory so restarts and
+other workers don't redraw it. The page then points an <img> at
+/qr/<digest>.png, which browsers may cache forever: the same digest can
+never name a different image.
+
+The route only serves images a page render has already produced, so it
+can't be used to make the server draw QR codes for arbitrary URLs.
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import qrcode as qr_code_lib
+from flask import abort, current_app, send_file, url_for
+from PIL import Image
+
+_CACHE_KEY = 'classpulse_qr'
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def _digest(url: str, size: int) -> str:
+    return hashlib.sha256(f'{int(size)}\n{url}'.encode('utf-8')).hexdigest()
+
+
+def _render_png(url: str, size: int) -> bytes:
+    qr = qr_code_lib.QRCode(
+        version=1,
+        error_correction=qr_code_lib.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    # NEAREST keeps module edges hard — a smoothed QR blurs at projector size
+    # and scanners struggle with it.
+    img = qr.make_image(fill_color="black", back_color="white") \
+        .resize((size, size), Image.NEAREST)
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+class _QRCache:
+    """digest -> PNG bytes, most recent last, over the on-disk copies."""
+
+    def __init__(self, directory, capacity):
+        self._dir = directory
+        self._capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+
+    def _path(self, digest):
+        return os.path.join(self._dir, f'{digest}.png')
+
+    def _remember(self, digest, png):
+        with self._lock:
+            self._images[digest] = png
+            self._images.move_to_end(digest)
+            while len(self._images) > self._capacity:
+                self._images.popitem(last=False)
+
+    def get(self, digest) -> Optional[bytes]:
+        with self._lock:
+            png = self._images.get(digest)
+            if png is not None:
+                self._images.move_to_end(digest)
+                return png
+        try:
+            with open(self._path(digest), 'rb') as fh:
+                png = fh.read()
+        except OSError:
+            return None
+        self._remember(digest, png)
+        return png
+
+    def ensure(self, url, size) -> str:
+        """The digest for (url, size), drawing and storing the image if new."""
+        digest = _digest(url, size)
+        if self.get(digest) is not None:
+            return digest
+        png = _render_png(url, size)
+        self._remember(digest, png)
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            # Write-then-rename, so a concurrent reader never sees half a file.
+            tmp = f'{self._path(digest)}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as fh:
+                fh.write(png)
+            os.replace(tmp, self._path(digest))
+        except OSError:
+            # Still served from memory; only the restart/other-worker reuse is lost.
+            current_app.logger.warning("Could not store QR code on disk", exc_info=True)
+        return digest
+
+
+def qr_image_url(url: str, size: int = 200) -> Optional[str]:
+    """The cacheable image URL of a QR code for `url`, or None if it couldn't
+    be drawn."""
+    try:
+        digest = current_app.extensions[_CACHE_KEY].ensure(url, size)
+    except Exception:
+        current_app.logger.exception("Error generating QR code")
+        return None
+    return url_for('qr_code', digest=digest)
+
+
+def init_app(app):
+    app.extensions[_CACHE_KEY] = _QRCache(app.config['QR_CACHE_DIR'],
+                                          app.config['QR_CACHE_SIZE'])
+
+    @app.route('/qr/<digest>.png')
+    def qr_code(digest):
+        if not _DIGEST_RE.match(digest):
+            abort(404)
+        png = app.extensions[_CACHE_KEY].get(digest)
+        if png is None:
+            abort(404)
+        response = send_file(io.BytesIO(png), mimetype='image/png', etag=digest,
+                             max_age=_ONE_YEAR, conditional=True)
+        # Content-addressed: a digest always names the same bytes.
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
@@ -1,8 +1,13 @@
 """Question option parsing/validation and serialization shared by routes."""
 
 import json
+import threading
+from collections import OrderedDict
 
-from .models import Response
+from sqlalchemy import func, select
+
+from .extensions import db
+from .models import Question, Response
 
 VALID_QUESTION_TYPES = (
     'multiple_choice', 'word_cloud', 'rating',
@@ -16,6 +21,12 @@ MAX_TITLE_LEN = 255
 MAX_OPTION_LEN = 500
 MAX_OPTIONS = 50
 
+# Types whose options JSON is a plain list of option labels.
+LIST_OPTION_TYPES = ('multiple_choice', 'multi_select', 'ranking', 'multiple_choice_other')
+
+# Questions whose compiled options are kept in memory (see compiled_options).
+_MAX_COMPILED = 4096
+
 
 def build_options(q_type, src):
     """Build the options JSON value for a question from a dict-like source.
@@ -89,45 +100,147 @@ def parse_question_payload(data):
     return (None, q_type, title, options_value)
 
 
-def parsed_options(question):
-    """The question's options JSON parsed, or a sensible empty value."""
+class CompiledOptions:
+    """A question's options JSON decoded once into what the hot paths need.
+
+    `parsed` is the decoded JSON ({} if it doesn't parse) and is shared
+    between requests, so treat it as read-only. `labels` are the choice
+    labels in order (option strings, or image labels), `label_set` the same
+    for membership tests; `rank_set` is the ranks {1..n} a ranking answer
+    must assign (empty if labels repeat, which no answer can rank).
+    `max_rating` and the numeric `minimum`/`maximum` (None when unset or
+    invalid) are the validation bounds.
+    """
+    __slots__ = ('parsed', 'labels', 'label_set', 'rank_set', 'max_rating', 'minimum',
+                 'maximum')
+
+    def __init__(self, q_type, options):
+        try:
+            parsed = json.loads(options) if options else {}
+        except (json.JSONDecodeError, TypeError):
+            parsed = {}
+        self.parsed = parsed
+        labels = ()
+        if isinstance(parsed, list):
+            if q_type in LIST_OPTION_TYPES:
+                labels = tuple(str(o) for o in parsed)
+            elif q_type == 'image_choice':
+                labels = tuple(str(it.get('label', '')) for it in parsed if isinstance(it, dict))
+        self.labels = labels
+        self.label_set = frozenset(labels)
+        self.rank_set = (frozenset(range(1, len(labels) + 1))
+                         if len(self.label_set) == len(labels) else frozenset())
+        config = parsed if isinstance(parsed, dict) else {}
+        try:
+            self.max_rating = int(config.get('max_rating', 5))
+        except (ValueError, TypeError):
+            self.max_rating = 5
+        self.minimum, self.maximum = (_bound(config, k) for k in ('min', 'max'))
+
+
+def _bound(config, key):
     try:
-        return json.loads(question.options) if question.options else {}
-    except (json.JSONDecodeError, TypeError):
+        return float(config[key]) if key in config else None
+    except (ValueError, TypeError):
+        return None
+
+
+_compiled_lock = threading.Lock()
+_compiled = OrderedDict()  # question_id -> ((type, options), CompiledOptions)
+
+
+def compiled_options(question):
+    """The question's CompiledOptions, decoded once per options revision.
+
+    Entries are keyed by question id and checked against the type and
+    options they were compiled from, so a stale entry is never served even
+    if forget_compiled_options wasn't called.
+    """
+    fingerprint = (question.type, question.options)
+    with _compiled_lock:
+        hit = _compiled.get(question.id)
+        if hit is not None and hit[0] == fingerprint:
+            _compiled.move_to_end(question.id)
+            return hit[1]
+    compiled = CompiledOptions(question.type, question.options)
+    if question.id is not None:
+        with _compiled_lock:
+            _compiled[question.id] = (fingerprint, compiled)
+            _compiled.move_to_end(question.id)
+            while len(_compiled) > _MAX_COMPILED:
+                _compiled.popitem(last=False)
+    return compiled
+
+
+def forget_compiled_options(question_id):
+    """Drop a question's compiled options after its type or options change."""
+    with _compiled_lock:
+        _compiled.pop(question_id, None)
+
+
+def response_counts(question_ids):
+    """{question_id: number of responses} in one grouped query; questions
+    without responses are absent."""
+    ids = list(question_ids)
+    if not ids:
         return {}
+    return dict(db.session.execute(
+        select(Response.question_id, func.count())
+        .where(Response.question_id.in_(ids)).group_by(Response.question_id)).all())
 
 
-def question_to_dict(q):
-    """Serialize a Question for the builder UI."""
-    parsed = parsed_options(q)
+def question_counts(session_ids):
+    """{session_id: number of questions} in one grouped query; sessions
+    without questions are absent."""
+    ids = list(session_ids)
+    if not ids:
+        return {}
+    return dict(db.session.execute(
+        select(Question.session_id, func.count())
+        .where(Question.session_id.in_(ids)).group_by(Question.session_id)).all())
+
+
+def question_to_dict(q, response_count=None):
+    """Serialize a Question for the builder UI. Pass `response_count` when
+    serializing several (see questions_to_dicts) to skip the COUNT query."""
+    compiled = compiled_options(q)
+    parsed = compiled.parsed
+    if response_count is None:
+        response_count = response_counts([q.id]).get(q.id, 0)
     data = {
         'id': q.id,
         'type': q.type,
         'title': q.title,
         'active': q.active,
-        'response_count': Response.query.filter_by(question_id=q.id).count(),
-        'options': parsed if (q.type in ('multiple_choice', 'multi_select', 'ranking',
-                                         'multiple_choice_other', 'image_choice')
-                              and isinstance(parsed, list)) else [],
-        'max_rating': 5,
+        'response_count': response_count,
+        'options': list(parsed) if (q.type in LIST_OPTION_TYPES + ('image_choice',)
+                                    and isinstance(parsed, list)) else [],
+        'max_rating': compiled.max_rating if q.type == 'rating' else 5,
     }
-    if q.type == 'rating' and isinstance(parsed, dict):
-        try:
-            data['max_rating'] = int(parsed.get('max_rating', 5))
-        except (ValueError, TypeError):
-            data['max_rating'] = 5
     if q.type == 'numeric' and isinstance(parsed, dict):
         data['numeric'] = {k: parsed[k] for k in ('min', 'max', 'step') if k in parsed}
     return data
 
 
-def session_to_dict(s, include_questions=False):
+def questions_to_dicts(questions):
+    """question_to_dict for each of `questions`, counting their responses in
+    one query."""
+    counts = response_counts(q.id for q in questions)
+    return [question_to_dict(q, counts.get(q.id, 0)) for q in questions]
+
+
+def session_to_dict(s, include_questions=False, question_count=None):
+    """Serialize a Session for the dashboard. Listing many, pass
+    `question_count` (see question_counts) rather than loading each
+    session's questions just to count them."""
     d = {
         'id': s.id, 'name': s.name, 'code': s.code,
         'active': s.active, 'archived': s.archived,
         'allow_proposals': s.allow_proposals,
-        'question_count': len(s.questions),
     }
     if include_questions:
-        d['questions'] = [question_to_dict(q) for q in s.questions]
+        d['questions'] = questions_to_dicts(s.questions)
+        d['question_count'] = len(d['questions'])
+    else:
+        d['question_count'] = len(s.questions) if question_count is None else question_count
     return d
@@ -0,0 +1,243 @@
+"""Storing audience responses, directly or through an opt-in write-behind buffer.
+
+By default every submission is written and committed in its own request.
+With RESPONSE_WRITE_BEHIND_MS > 0 a submission is instead validated, queued
+in-process and acknowledged at once; a single writer flushes the queue as
+one group commit every RESPONSE_WRITE_BEHIND_MS, or as soon as
+RESPONSE_WRITE_BEHIND_MAX_ROWS are waiting, so a burst of votes costs one
+transaction (and one fsync on SQLite) instead of one each. Queued responses
+count in live stats straight away (see aggregates.hold_unwritten) and are
+flushed when the process exits.
+
+The trade-off: an acknowledged response lives only in this process's memory
+until its flush, so a crash (not a clean shutdown) can lose up to one
+window's worth. Leave it off unless submission bursts are a bottleneck.
+"""
+
+import atexit
+import threading
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from .aggregates import (
+    hold_unwritten, lock_for_write, record_response, release_unwritten,
+    release_unwritten_on_commit, response_diff,
+    tallies,
+)
+from .extensions import db, socketio
+from .models import Question, Response, utcnow_iso
+from .sockets import broadcast_results
+
+_BUFFER_KEY = 'classpulse_write_behind'
+
+_Queued = namedtuple('_Queued', 'seq question_id respondent_id value total_delta diff')
+
+
+def upsert_response(question, respondent_id, response_value):
+    """Insert the respondent's answer, or overwrite it (and its timestamp) if
+    they already answered — one statement against the unique
+    (question_id, respondent_id) index. No commit."""
+    values = {'question_id': question.id, 'session_id': question.session_id,
+              'respondent_id': respondent_id, 'response_value': response_value,
+              'created_at': utcnow_iso()}
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # No portable upsert; the unique index still rejects a racing duplicate.
+        existing = Response.query.filter_by(question_id=question.id,
+                                            respondent_id=respondent_id).first()
+        if existing:
+            existing.response_value = values['response_value']
+            existing.created_at = values['created_at']
+        else:
+            db.session.add(Response(**values))
+        return
+    stmt = insert(Response).values(**values)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[Response.question_id, Response.respondent_id],
+        set_={'response_value': stmt.excluded.response_value,
+              'created_at': stmt.excluded.created_at}))
+
+
+def _stored_value(question_id, respondent_id):
+    return db.session.execute(
+        select(Response.response_value)
+        .where(Response.question_id == question_id,
+               Response.respondent_id == respondent_id)).scalar()
+
+
+def write_response(question, respondent_id, response_value):
+    """Write one answer and its tally diff into the current transaction.
+    No commit.
+
+    The tallies need the answer being replaced, so it's read under the
+    question's write lock: a double-submit can't count it twice.
+    """
+    lock_for_write(question)
+    record_response(question, _stored_value(question.id, respondent_id), response_value)
+    upsert_response(question, respondent_id, response_value)
+
+
+class _ResponseBuffer:
+    """The write-behind queue for one app, and its single writer."""
+
+    def __init__(self, app, window_seconds, max_rows):
+        self._app = app
+        self._window = window_seconds
+        self._max_rows = max(1, int(max_rows))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one writer at a time
+        self._queue = []
+        # (question_id, respondent_id) -> (seq, value) of the newest answer
+        # not yet committed, queued or mid-flush: what a resubmission replaces.
+        self._latest = {}
+        self._seq = 0
+        self._flush_pending = False
+
+    def _replaced_value(self, key):
+        with self._lock:
+            if key in self._latest:
+                return True, self._latest[key][1]
+        return False, None
+
+    def submit(self, question, respondent_id, response_value):
+        key = (question.id, respondent_id)
+        queued, previous = self._replaced_value(key)
+        if not queued:
+            tallies(question)  # build before the diff below is held against it
+            previous = _stored_value(question.id, respondent_id)
+            # A resubmission may have been queued meanwhile; it's the newer one.
+            queued, newer = self._replaced_value(key)
+            if queued:
+                previous = newer
+        total_delta, diff = response_diff(question, previous, response_value)
+        with self._lock:
+            self._seq += 1
+            self._queue.append(_Queued(self._seq, question.id, respondent_id, response_value,
+                                       total_delta, diff))
+            self._latest[key] = (self._seq, response_value)
+            hold_unwritten(question.id, total_delta, diff)
+            full = len(self._queue) >= self._max_rows
+            start_timer = not self._flush_pending
+            self._flush_pending = True
+        if full:
+            socketio.start_background_task(self.flush)
+        elif start_timer:
+            socketio.start_background_task(self._flush_after_window)
+
+    def _flush_after_window(self):
+        socketio.sleep(self._window)
+        self.flush()
+
+    def flush(self):
+        """Write everything queued so far as one group commit."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+                self._flush_pending = False
+            if not batch:
+                return
+            with self._app.app_context():
+                settled = set()  # seqs whose held diff has been released
+                try:
+                    self._write(batch, settled)
+                finally:
+                    with self._lock:
+                        for item in batch:
+                            key = (item.question_id, item.respondent_id)
+                            if self._latest.get(key, (None,))[0] == item.seq:
+                                del self._latest[key]
+                            if item.seq not in settled:
+                                release_unwritten(item.question_id, item.total_delta, item.diff)
+                    db.session.remove()
+                for question_id in sorted({item.question_id for item in batch}):
+                    broadcast_results(question_id)
+
+    def _write(self, batch, settled):
+        """Write `batch`, adding to `settled` each item whose held diff was
+        released — by the commit that wrote it, so it's counted once
+        throughout; flush() releases the rest."""
+        questions = {q.id: q for q in Question.query.filter(
+            Question.id.in_({item.question_id for item in batch}))}
+        for question in questions.values():
+            tallies(question)  # builds commit on their own, so before any writes
+        # Deleted while queued: their answers go with them.
+        batch = [item for item in batch if item.question_id in questions]
+        try:
+            for item in batch:
+                self._write_item(questions[item.question_id], item)
+            db.session.commit()
+            settled.update(item.seq for item in batch)
+            return
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception(
+                f"Write-behind group commit of {len(batch)} responses failed; "
+                f"retrying one at a time")
+        for item in batch:
+            try:
+                self._write_item(questions[item.question_id], item)
+                db.session.commit()
+                settled.add(item.seq)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception(
+                    f"Dropped a buffered response to question_{item.question_id}")
+
+    @staticmethod
+    def _write_item(question, item):
+        write_response(question, item.respondent_id, item.value)
+        release_unwritten_on_commit(item.question_id, item.total_delta, item.diff)
+
+
+def submit_response(question, respondent_id, response_value):
+    """Store an answer: queued when write-behind is on, otherwise written
+    and committed now. Either way live results are pushed."""
+    buffer = current_app.extensions.get(_BUFFER_KEY)
+    if buffer is not None:
+        buffer.submit(question, respondent_id, response_value)
+    else:
+        write_response(question, respondent_id, response_value)
+        db.session.commit()
+    broadcast_results(question.id)
+
+
+def submit_responses(answers, respondent_id):
+    """Store one respondent's answers to several questions, `answers` being
+    (question, response_value) pairs: one transaction (or one trip through the
+    write-behind queue), then one results push per question."""
+    # Question order, so concurrent batches take the write locks in one order.
+    answers = sorted(answers, key=lambda answer: answer[0].id)
+    buffer = current_app.extensions.get(_BUFFER_KEY)
+    if buffer is not None:
+        for question, response_value in answers:
+            buffer.submit(question, respondent_id, response_value)
+    else:
+        for question, _ in answers:
+            tallies(question)  # builds commit on their own, so before any writes
+        for question, response_value in answers:
+            write_response(question, respondent_id, response_value)
+        db.session.commit()
+    for question_id in sorted({question.id for question, _ in answers}):
+        broadcast_results(question_id)
+
+
+def flush_responses():
+    """Write any buffered responses now (no-op without write-behind)."""
+    buffer = current_app.extensions.get(_BUFFER_KEY)
+    if buffer is not None:
+        buffer.flush()
+
+
+def init_app(app):
+    window_ms = app.config['RESPONSE_WRITE_BEHIND_MS']
+    if window_ms > 0:
+        buffer = _ResponseBuffer(app, window_ms / 1000,
+                                 app.config['RESPONSE_WRITE_BEHIND_MAX_ROWS'])
+        app.extensions[_BUFFER_KEY] = buffer
+        atexit.register(buffer.flush)
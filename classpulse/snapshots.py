@@ -0,0 +1,89 @@
+"""Frozen results for archived sessions.
+
+Archiving a session deactivates it for good (until unarchived), so its
+results can't change. Rather than recompute every question's stats each
+time last term's session is reviewed, they are computed once on archive
+and stored as one compressed row; the results API and socket joins then
+serve that row. Unarchiving drops it. Sessions archived before snapshots
+existed are frozen the first time their results are read.
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import SessionSnapshot, utcnow_iso
+from .stats import questions_stats
+
+
+def _load(session_id) -> Optional[Dict[int, Dict[str, Any]]]:
+    row = db.session.get(SessionSnapshot, session_id)
+    if row is None:
+        return None
+    return {int(qid): stats
+            for qid, stats in json.loads(zlib.decompress(row.stats)).items()}
+
+
+def freeze_session(s) -> Dict[int, Dict[str, Any]]:
+    """Snapshot the archived session `s`'s results and commit. Returns them."""
+    from .responses import flush_responses  # lazy: responses -> sockets -> here
+    flush_responses()  # answers still queued before the archive count too
+    results = questions_stats(s.questions)
+    blob = zlib.compress(json.dumps(results, separators=(',', ':')).encode('utf-8'))
+    _store(s.id, blob)
+    db.session.commit()
+    return results
+
+
+def _store(session_id, blob):
+    """Insert or overwrite the snapshot row in one statement, so two first
+    reads freezing the same session at once don't collide. No commit."""
+    values = {'session_id': session_id, 'stats': blob, 'created_at': utcnow_iso()}
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # No portable upsert: a racing insert loses to the primary key, and
+        # the snapshot it hit is as good as ours.
+        row = db.session.get(SessionSnapshot, session_id)
+        if row is not None:
+            row.stats, row.created_at = blob, values['created_at']
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(SessionSnapshot(**values))
+        except IntegrityError:
+            pass
+        return
+    stmt = insert(SessionSnapshot).values(**values)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[SessionSnapshot.session_id],
+        set_={'stats': stmt.excluded.stats, 'created_at': stmt.excluded.created_at}))
+
+
+def thaw_session(session_id):
+    """Drop a session's snapshot (on unarchive) and commit."""
+    SessionSnapshot.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def session_stats(s) -> Dict[int, Dict[str, Any]]:
+    """{question_id: stats} for every question of `s`: live, or from its
+    snapshot once archived."""
+    if not s.archived:
+        return questions_stats(s.questions)
+    frozen = _load(s.id)
+    return frozen if frozen is not None else freeze_session(s)
+
+
+def frozen_question_stats(question) -> Optional[Dict[str, Any]]:
+    """The question's stats from its session's snapshot, or None while the
+    session isn't archived."""
+    if not question.session.archived:
+        return None
+    return session_stats(question.session).get(question.id)
@@ -11,19 +11,34 @@ authenticated owner. IDs are sequential integers — without this check anyone
 could enumerate and stream every session's results.
 """
 
+import threading
+from collections import OrderedDict
+
 from flask import current_app, request, session as http_session
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from .extensions import db, socketio
 from .models import Question, Session
-from .stats import get_question_stats
+from .snapshots import frozen_question_stats, session_stats
+from .stats import get_question_stats, questions_stats, short_answers, stats_delta
 from flask_socketio import emit, join_room, leave_room
 
+_SCHEDULER_KEY = 'classpulse_broadcasts'
+_FEED_KEY = 'classpulse_results_feed'
+
 
 def _is_owner(db_session) -> bool:
     uid = http_session.get('user_id')
     return uid is not None and db_session.user_id == uid
 
 
+def _question_with_session(question_id):
+    """The question with its session loaded in the same SELECT, for
+    _can_watch_question."""
+    return db.session.get(Question, question_id, options=[joinedload(Question.session)])
+
+
 def _can_watch_question(question) -> bool:
     if question is None:
         return False
@@ -31,14 +46,110 @@ def _can_watch_question(question) -> bool:
     return _is_owner(s) or (question.active and s.is_live)
 
 
-def broadcast_results(question_id: int):
-    """Fetches latest stats and emits them to the question's room."""
+class _ResultsFeed:
+    """The stats last emitted to each question room, so the next emit can
+    carry only what changed since then. Bounded LRU; a question that falls
+    out simply gets a full snapshot next time."""
+
+    def __init__(self, max_questions):
+        self._lock = threading.Lock()
+        self._max = max(1, int(max_questions))
+        self._last = OrderedDict()
+
+    def payload(self, question_id, stats):
+        """The update_results payload taking the room from its last emit to
+        `stats`, or None if nothing changed. Stats are computed outside the
+        lock, so two emits can arrive out of order; one older than the last
+        emitted version is dropped rather than moving the room backwards."""
+        with self._lock:
+            prev = self._last.get(question_id)
+            if (prev is not None and stats.get('version') is not None
+                    and prev.get('version') is not None
+                    and stats['version'] < prev['version']):
+                return None
+            self._last[question_id] = stats
+            self._last.move_to_end(question_id)
+            while len(self._last) > self._max:
+                self._last.popitem(last=False)
+        if prev is None or 'error' in stats or 'error' in prev:
+            return {'question_id': question_id, 'stats': stats}
+        delta = stats_delta(prev, stats)
+        if delta is None:
+            return {'question_id': question_id, 'stats': stats}
+        if not delta:
+            return None
+        return {'question_id': question_id, 'base_version': prev.get('version'),
+                'version': stats.get('version'), 'delta': delta}
+
+
+def _emit_results(question_id: int):
+    """Fetches latest stats and emits them (as a delta where possible) to the
+    question's room."""
     stats = get_question_stats(question_id)
+    payload = current_app.extensions[_FEED_KEY].payload(question_id, stats)
+    if payload is None:
+        return
     room_name = f'question_{question_id}'
-    socketio.emit('update_results', {'question_id': question_id, 'stats': stats}, room=room_name)
+    socketio.emit('update_results', payload, room=room_name)
     current_app.logger.debug(f"Emitted update_results for room {room_name}")
 
 
+def _emit_snapshot(question):
+    """Full current stats to the requesting client only (frozen ones, if the
+    session is archived)."""
+    stats = frozen_question_stats(question) or get_question_stats(question.id)
+    emit('update_results', {'question_id': question.id, 'stats': stats}, room=request.sid)
+
+
+class _BroadcastScheduler:
+    """Coalesces result broadcasts: questions are marked dirty as responses
+    commit, and one background flush per window computes each dirty
+    question's stats once and emits them once, however many responses
+    landed in between."""
+
+    def __init__(self, app, window_seconds):
+        self._app = app
+        self._window = window_seconds
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._flush_pending = False
+
+    def mark(self, question_id):
+        with self._lock:
+            self._dirty.add(question_id)
+            if self._flush_pending:
+                return
+            self._flush_pending = True
+        socketio.start_background_task(self._flush_after_window)
+
+    def _flush_after_window(self):
+        socketio.sleep(self._window)
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._flush_pending = False
+        with self._app.app_context():
+            for question_id in sorted(dirty):
+                try:
+                    _emit_results(question_id)
+                except Exception:
+                    current_app.logger.exception(
+                        f"Failed to broadcast results for question_{question_id}")
+
+
+def broadcast_results(question_id: int):
+    """Push a question's latest stats to its room.
+
+    With RESULTS_BROADCAST_WINDOW_MS > 0 (the default) this only marks the
+    question dirty; the emit follows within one window, shared with every
+    other response that arrived meanwhile. 0 emits immediately.
+    """
+    scheduler = current_app.extensions.get(_SCHEDULER_KEY)
+    if scheduler is None:
+        _emit_results(question_id)
+    else:
+        scheduler.mark(question_id)
+
+
 def broadcast_proposals_changed(session_id: int):
     """Nudge everyone in the session room (audience + presenter dashboard) to
     re-fetch the proposal list. Payload is just the session id — clients pull
@@ -51,9 +162,15 @@ def broadcast_questions_changed(session_id: int):
     """Notify audience members in a session room that the set of active
     questions (or the session's own active state) has changed, so their page
     can update live instead of requiring a manual refresh."""
-    s = db.session.get(Session, session_id)
-    active_ids = [q.id for q in s.questions if q.active] if s else []
-    session_active = bool(s and s.is_live)
+    # Just the flags and ids: no Session or Question rows to load.
+    live = db.session.execute(
+        select(Session.id).where(Session.id == session_id, Session.active.is_(True),
+                                 Session.archived.is_(False), Session.deleted.is_(False))
+    ).first()
+    active_ids = list(db.session.execute(
+        select(Question.id).where(Question.session_id == session_id, Question.active.is_(True))
+        .order_by(Question.order, Question.created_at)).scalars())
+    session_active = live is not None
     socketio.emit(
         'questions_changed',
         {
@@ -87,15 +204,80 @@ def handle_join_room(data):
     except (ValueError, TypeError):
         current_app.logger.warning(f"Invalid question_id received for join: {question_id!r}")
         return
-    question = db.session.get(Question, q_id)
+    question = _question_with_session(q_id)
     if not _can_watch_question(question):
         current_app.logger.info(f"Refused join to question_{q_id} for {request.sid}")
         return
     room_name = f'question_{q_id}'
     join_room(room_name)
     # Send current results immediately to the joining client only.
-    stats = get_question_stats(q_id)
-    emit('update_results', {'question_id': q_id, 'stats': stats}, room=request.sid)
+    _emit_snapshot(question)
+
+
+@socketio.on('join_session_results')
+def handle_join_session_results(data):
+    """Join the rooms of many of a session's questions at once and get one
+    'session_results' snapshot of them all, instead of a 'join' (and a stats
+    computation) per question. Optional `question_ids` narrows the set;
+    anyone but the owner only gets the session's active questions, and only
+    while it's live."""
+    data = data or {}
+    try:
+        s_id = int(data.get('session_id'))
+    except (ValueError, TypeError):
+        return
+    s = db.session.get(Session, s_id)
+    if s is None:
+        return
+    if _is_owner(s):
+        questions = list(s.questions)
+    elif s.is_live:
+        questions = [q for q in s.questions if q.active]
+    else:
+        current_app.logger.info(f"Refused session results for session_{s_id} to {request.sid}")
+        return
+    wanted = data.get('question_ids')
+    if isinstance(wanted, list):
+        wanted = {str(w) for w in wanted}
+        questions = [q for q in questions if str(q.id) in wanted]
+    for q in questions:
+        join_room(f'question_{q.id}')
+    if s.archived:
+        frozen = session_stats(s)
+        results = {q.id: frozen[q.id] for q in questions if q.id in frozen}
+    else:
+        results = questions_stats(questions)
+    emit('session_results', {'session_id': s_id, 'results': results}, room=request.sid)
+
+
+@socketio.on('request_snapshot')
+def handle_request_snapshot(data):
+    """A client that missed a delta (its version doesn't match the update's
+    base_version) asks for the full stats again."""
+    try:
+        q_id = int((data or {}).get('question_id'))
+    except (ValueError, TypeError):
+        return
+    question = _question_with_session(q_id)
+    if _can_watch_question(question):
+        _emit_snapshot(question)
+
+
+@socketio.on('answers_since')
+def handle_answers_since(data):
+    """Short answers newer than the client's cursor (a page at a time), so a
+    reconnecting client catches up without re-fetching the whole list."""
+    data = data or {}
+    try:
+        q_id = int(data.get('question_id'))
+    except (ValueError, TypeError):
+        return
+    question = db.session.get(Question, q_id)
+    if not _can_watch_question(question) or question.type != 'short_answer':
+        return
+    cursor = data.get('cursor')
+    page = short_answers(q_id, since=cursor if isinstance(cursor, str) else None)
+    emit('answers', {'question_id': q_id, **page}, room=request.sid)
 
 
 @socketio.on('join_session')
@@ -128,3 +310,10 @@ def handle_leave_room(data):
     except (ValueError, TypeError):
         return
     leave_room(f'question_{q_id}')
+
+
+def init_app(app):
+    app.extensions[_FEED_KEY] = _ResultsFeed(app.config['AGGREGATE_CACHE_SIZE'])
+    window_ms = app.config['RESULTS_BROADCAST_WINDOW_MS']
+    if window_ms > 0:
+        app.extensions[_SCHEDULER_KEY] = _BroadcastScheduler(app, window_ms / 1000)
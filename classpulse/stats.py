@@ -1,183 +1,244 @@
 """Per-question result statistics used by the live views and exports."""
 
-import json
-from typing import Any, Dict
+from bisect import bisect_right
+from typing import Any, Dict, Optional
 
+from flask import current_app
+from sqlalchemy import and_, or_, select
+
+from .aggregates import OTHER_BUCKET, exact_counts, tallies, tallies_for
 from .extensions import db
 from .models import Question, Response
-
-# Basic English stop words list (can be expanded)
-STOP_WORDS = frozenset([
-    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "aren't", "as", "at",
-    "be", "because", "been", "before", "being", "below", "between", "both", "but", "by",
-    "can't", "cannot", "could", "couldn't", "did", "didn't", "do", "does", "doesn't", "doing", "don't", "down", "during",
-    "each", "few", "for", "from", "further", "had", "hadn't", "has", "hasn't", "have", "haven't", "having", "he", "he'd",
-    "he'll", "he's", "her", "here", "here's", "hers", "herself", "him", "himself", "his", "how", "how's",
-    "i", "i'd", "i'll", "i'm", "i've", "if", "in", "into", "is", "isn't", "it", "it's", "its", "itself",
-    "let's", "me", "more", "most", "mustn't", "my", "myself",
-    "no", "nor", "not", "of", "off", "on", "once", "only", "or", "other", "ought", "our", "ours", "ourselves", "out",
-    "over", "own", "same", "shan't", "she", "she'd", "she'll", "she's", "should", "shouldn't", "so", "some", "such",
-    "than", "that", "that's", "the", "their", "theirs", "them", "themselves", "then", "there", "there's", "these", "they",
-    "they'd", "they'll", "they're", "they've", "this", "those", "through", "to", "too", "under", "until", "up", "very",
-    "was", "wasn't", "we", "we'd", "we'll", "we're", "we've", "were", "weren't", "what", "what's", "when", "when's",
-    "where", "where's", "which", "while", "who", "who's", "whom", "why", "why's", "with", "won't", "would", "wouldn't",
-    "you", "you'd", "you'll", "you're", "you've", "your", "yours", "yourself", "yourselves"
-])
-
-
-def _word_counts(responses):
-    words = {}
-    for resp in responses:
-        for word in str(resp.response_value).lower().split():
-            cleaned_word = ''.join(filter(str.isalnum, word))
-            if cleaned_word and cleaned_word not in STOP_WORDS:
-                words[cleaned_word] = words.get(cleaned_word, 0) + 1
-    return words
-
-
-def get_question_stats(question_id: int) -> Dict[str, Any]:
-    """Gets statistics for a question based on its type."""
+from .questions import compiled_options
+
+
+def _cloud(question_id, tallied, exact):
+    """Word-cloud terms from a free-text question's tallies: the sketch's top
+    WORD_CLOUD_TOP_K for live views, every term with `exact`."""
+    if exact:
+        terms = exact_counts(question_id).items()
+    elif tallied.capacity is not None:
+        terms = tallied.top(current_app.config['WORD_CLOUD_TOP_K'])
+    else:
+        terms = ((w, c) for w, c in tallied.counts.items() if c > 0)
+    return [{"text": w, "weight": c} for w, c in terms]
+
+
+def _bucket_label(x):
+    """Short label for a histogram edge: '2', '2.5'."""
+    return f"{x:.1f}".rstrip('0').rstrip('.') if not float(x).is_integer() else str(int(x))
+
+
+def _histogram(dist, lo, hi, buckets):
+    """Equal-width bucket counts over [lo, hi] in a single pass: each distinct
+    value is placed by bisecting the inner bucket edges. Buckets are
+    half-open except the last, which includes hi; values outside are ignored."""
+    buckets = max(1, int(buckets))
+    step = (hi - lo) / buckets
+    inner_edges = [lo + i * step for i in range(1, buckets)]
+    counts = [0] * buckets
+    for v, n in dist:
+        if lo <= v <= hi:
+            counts[bisect_right(inner_edges, v)] += n
+    return {f"{_bucket_label(lo + i * step)}–{_bucket_label(lo + (i + 1) * step)}": counts[i]
+            for i in range(buckets)}
+
+
+def _ranked(dist, k):
+    """The k-th smallest value (0-based) of ascending (value, count) pairs."""
+    seen = 0
+    for v, n in dist:
+        seen += n
+        if seen > k:
+            return v
+    return dist[-1][0]
+
+
+def _quantile(dist, total, q):
+    """The q-quantile of ascending (value, count) pairs totalling `total`,
+    interpolating linearly between the closest ranks."""
+    pos = q * (total - 1)
+    k, frac = int(pos), pos - int(pos)
+    below = _ranked(dist, k)
+    return below + (_ranked(dist, k + 1) - below) * frac if frac else below
+
+
+def encode_cursor(answer: Dict[str, Any]) -> str:
+    """Opaque position of a short answer in the newest-first feed."""
+    return f"{answer['ts']}|{answer['id']}"
+
+
+def _decode_cursor(cursor: Optional[str]):
+    ts, sep, rid = (cursor or '').rpartition('|')
+    try:
+        return (ts, int(rid)) if sep else None
+    except ValueError:
+        return None
+
+
+def short_answers(question_id: int, since: Optional[str] = None,
+                  before: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """A newest-first page of a short_answer question's answers.
+
+    `since` returns only answers newer than that cursor (including ones a
+    respondent rewrote, which keep their id — replace by id); `before` pages
+    backwards from that cursor. Each page holds at most `limit` answers
+    (SHORT_ANSWER_PAGE_SIZE by default). The result carries `newest`, the
+    cursor to poll `since` next, and `older`, the cursor for the page before
+    this one, or None when there is nothing older.
+    """
+    if limit is None:
+        limit = current_app.config['SHORT_ANSWER_PAGE_SIZE']
+    limit = max(1, int(limit))
+    query = (select(Response.id, Response.response_value, Response.created_at)
+             .where(Response.question_id == question_id))
+    after, upto = _decode_cursor(since), _decode_cursor(before)
+    if after:
+        query = query.where(or_(Response.created_at > after[0],
+                                and_(Response.created_at == after[0], Response.id > after[1])))
+        # Oldest first so a long gap is walked forward without skipping any.
+        query = query.order_by(Response.created_at, Response.id)
+    else:
+        if upto:
+            query = query.where(or_(Response.created_at < upto[0],
+                                    and_(Response.created_at == upto[0], Response.id < upto[1])))
+        query = query.order_by(Response.created_at.desc(), Response.id.desc())
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    more, rows = len(rows) > limit, rows[:limit]
+    if after:
+        rows.reverse()
+    answers = [{"id": rid, "text": str(value).strip(), "ts": ts} for rid, value, ts in rows]
+    newest = encode_cursor(answers[0]) if answers else since
+    older = encode_cursor(answers[-1]) if more and not after else None
+    return {"answers": [a for a in answers if a["text"]], "newest": newest,
+            "older": older, "more_newer": bool(after and more)}
+
+
+def get_question_stats(question_id: int, exact: bool = False) -> Dict[str, Any]:
+    """Gets statistics for a question based on its type.
+
+    Live views get word clouds capped to the top WORD_CLOUD_TOP_K terms;
+    `exact` returns every term with its exact count instead.
+    """
     question = db.session.get(Question, question_id)
     if not question:
         return {"error": "Question not found"}
+    return _question_stats(question, tallies(question), exact)
+
+
+def questions_stats(questions) -> Dict[int, Dict[str, Any]]:
+    """Live stats for several questions (typically a whole session's) at
+    once: {question_id: stats}, each as get_question_stats would return it.
+    Their tallies are fetched together, so uncached ones cost two queries
+    in total; only short answers still read a page per question."""
+    questions = list(questions)
+    tallied = tallies_for(questions)
+    return {q.id: _question_stats(q, tallied[q.id], False) for q in questions}
+
 
-    all_responses = Response.query.filter_by(question_id=question_id).all()
-    total_responses = len(all_responses)
-    stats: Dict[str, Any] = {"total_responses": total_responses,
+def _question_stats(question, tallied, exact):
+    question_id = question.id
+    stats: Dict[str, Any] = {"total_responses": tallied.total, "version": tallied.version,
                              "type": question.type, "title": question.title}
 
-    if question.type == 'multiple_choice':
-        try:
-            options = json.loads(question.options)
-            if not isinstance(options, list):
-                options = []
-        except json.JSONDecodeError:
-            options = []
-        options = [str(opt) for opt in options]
-        results = dict.fromkeys(options, 0)
-        for resp in all_responses:
-            if str(resp.response_value) in results:
-                results[str(resp.response_value)] += 1
-        stats["results"] = results
-        stats["options"] = options
+    compiled = compiled_options(question)
+    labels = list(compiled.labels)
+
+    if question.type in ('multiple_choice', 'multi_select', 'image_choice'):
+        stats["results"] = {o: tallied.counts.get(o, 0) for o in labels}
+        stats["options"] = labels
 
     elif question.type == 'word_cloud':
-        stats["results"] = [{"text": w, "weight": c} for w, c in _word_counts(all_responses).items()]
+        stats["results"] = _cloud(question_id, tallied, exact)
 
     elif question.type == 'rating':
-        try:
-            config = json.loads(question.options)
-            max_rating = int(config.get('max_rating', 5))
-        except (json.JSONDecodeError, AttributeError, ValueError):
-            max_rating = 5
-        results = {str(i): 0 for i in range(1, max_rating + 1)}
-        for resp in all_responses:
-            if str(resp.response_value) in results:
-                results[str(resp.response_value)] += 1
-        stats["results"] = results
+        max_rating = compiled.max_rating
+        stats["results"] = {str(i): tallied.counts.get(str(i), 0)
+                            for i in range(1, max_rating + 1)}
         stats["max_rating"] = max_rating
 
-    elif question.type == 'multi_select':
-        try:
-            options = [str(o) for o in (json.loads(question.options) if question.options else [])]
-        except (json.JSONDecodeError, TypeError):
-            options = []
-        results = dict.fromkeys(options, 0)
-        for resp in all_responses:
-            for sel in str(resp.response_value).split('\n'):
-                if sel in results:
-                    results[sel] += 1
-        stats["results"] = results
-        stats["options"] = options
-
     elif question.type == 'short_answer':
-        answers = []
-        for resp in all_responses:
-            text = str(resp.response_value).strip()
-            if text:
-                answers.append({"text": text, "ts": resp.created_at})
-        answers.sort(key=lambda a: a.get("ts") or "", reverse=True)
-        stats["results"] = answers  # list of {text, ts}, newest first — drives the answers view
-        stats["cloud"] = [{"text": w, "weight": c}
-                          for w, c in _word_counts(all_responses).items()]  # for the cloud toggle
+        page = short_answers(question_id)
+        # {id, text, ts} newest first, one page of them — drives the answers
+        # view; older ones are fetched by cursor (see short_answers).
+        stats["results"] = page["answers"]
+        stats["older"] = page["older"]
+        stats["cloud"] = _cloud(question_id, tallied, exact)  # for the cloud toggle
 
     elif question.type == 'ranking':
-        try:
-            options = [str(o) for o in (json.loads(question.options) if question.options else [])]
-        except (json.JSONDecodeError, TypeError):
-            options = []
-        sums, counts = dict.fromkeys(options, 0.0), dict.fromkeys(options, 0)
-        for resp in all_responses:
-            for pos, opt in enumerate(str(resp.response_value).split('\n'), 1):
-                if opt in sums:
-                    sums[opt] += pos
-                    counts[opt] += 1
-        stats["results"] = {o: (round(sums[o] / counts[o], 2) if counts[o] else 0) for o in options}
-        stats["options"] = options
+        sums, counts = tallied.weights, tallied.counts
+        stats["results"] = {o: (round(sums[o] / counts[o], 2) if counts.get(o) else 0)
+                            for o in labels}
+        stats["options"] = labels
 
     elif question.type == 'numeric':
-        vals = []
-        for resp in all_responses:
-            try:
-                vals.append(float(resp.response_value))
-            except (ValueError, TypeError):
-                pass
-        try:
-            cfg = json.loads(question.options) if question.options else {}
-        except (json.JSONDecodeError, TypeError):
-            cfg = {}
-        lo = hi = None
-        if isinstance(cfg, dict) and 'min' in cfg and 'max' in cfg:
-            try:
-                lo, hi = float(cfg['min']), float(cfg['max'])
-            except (ValueError, TypeError):
-                lo = hi = None
-        if lo is None and vals:
-            lo, hi = min(vals), max(vals)
+        # Distinct values with their counts, ascending — tallied at write time.
+        dist = sorted((float(v), n) for v, n in tallied.counts.items() if n > 0)
+        n_vals = sum(n for _, n in dist)
+        lo, hi = compiled.minimum, compiled.maximum
+        if lo is None or hi is None:
+            lo, hi = (dist[0][0], dist[-1][0]) if dist else (None, None)
         results = {}
-        if vals and lo is not None and hi is not None and hi > lo:
-            nb, step = 10, (hi - lo) / 10
-
-            def _lbl(x):
-                return f"{x:.1f}".rstrip('0').rstrip('.') if not float(x).is_integer() else str(int(x))
-            for i in range(nb):
-                a, b = lo + i * step, lo + (i + 1) * step
-                key = f"{_lbl(a)}–{_lbl(b)}"
-                results[key] = sum(1 for v in vals if a <= v < b or (i == nb - 1 and v == b))
-        elif vals:
-            results[str(vals[0])] = len(vals)
-        stats["results"] = results
-        if vals:
-            stats["average"] = round(sum(vals) / len(vals), 2)
-
-    elif question.type == 'image_choice':
-        try:
-            items = json.loads(question.options) if question.options else []
-        except (json.JSONDecodeError, TypeError):
-            items = []
-        labels = [str(it.get('label', '')) for it in items] if isinstance(items, list) else []
-        results = dict.fromkeys(labels, 0)
-        for resp in all_responses:
-            v = str(resp.response_value)
-            if v in results:
-                results[v] += 1
+        if dist and lo is not None and hi is not None and hi > lo:
+            results = _histogram(dist, lo, hi, current_app.config['NUMERIC_HISTOGRAM_BUCKETS'])
+        elif dist:
+            results[str(dist[0][0])] = n_vals
         stats["results"] = results
-        stats["options"] = labels
+        if dist:
+            stats["average"] = round(sum(v * n for v, n in dist) / n_vals, 2)
+            q1, median, q3 = (_quantile(dist, n_vals, q) for q in (0.25, 0.5, 0.75))
+            stats["median"] = round(median, 2)
+            stats["q1"], stats["q3"] = round(q1, 2), round(q3, 2)
 
     elif question.type == 'multiple_choice_other':
-        try:
-            options = [str(o) for o in (json.loads(question.options) if question.options else [])]
-        except (json.JSONDecodeError, TypeError):
-            options = []
-        labels = options + ['Other']
-        results = dict.fromkeys(labels, 0)
-        for resp in all_responses:
-            v = str(resp.response_value)
-            if v in options:
-                results[v] += 1
-            else:
-                results['Other'] += 1
-        stats["results"] = results
+        labels.append(OTHER_BUCKET)
+        stats["results"] = {label: tallied.counts.get(label, 0) for label in labels}
         stats["options"] = labels
 
     return stats
+
+
+def _is_word_list(stats, key):
+    return key == 'cloud' or (key == 'results' and stats.get('type') == 'word_cloud')
+
+
+def stats_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """What changed between two stats snapshots of the same question.
+
+    Sections: 'set' replaces scalar fields, 'merge' updates changed counters in
+    dict results, 'weights' updates word-cloud terms by text (0 = drop it) and
+    'prepend' carries newly arrived short answers. Returns None when the change
+    can't be expressed that way and the receiver needs a full snapshot.
+    """
+    if old.get('type') != new.get('type') or set(old) - set(new):
+        return None
+    delta: Dict[str, Any] = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if key == 'version' or value == before:
+            continue
+        if isinstance(value, dict) and isinstance(before, dict):
+            if set(before) - set(value):
+                return None
+            delta.setdefault('merge', {})[key] = {
+                k: v for k, v in value.items() if before.get(k) != v}
+        elif _is_word_list(new, key) and isinstance(before, list):
+            was = {w['text']: w['weight'] for w in before}
+            now = {w['text']: w['weight'] for w in value}
+            delta.setdefault('weights', {})[key] = {
+                t: now.get(t, 0) for t in was.keys() | now.keys() if was.get(t) != now.get(t)}
+        elif key == 'results' and new.get('type') == 'short_answer' and isinstance(before, list):
+            # Newest first: new and rewritten answers move to the front. The
+            # receiver drops any answer with a prepended id and prepends; if
+            # that can't rebuild the new page — allowing for a longer tail
+            # when the page is full and more exist — send a snapshot.
+            added = [a for a in value if a not in before]
+            ids = {a.get('id') for a in added}
+            rebuilt = added + [a for a in before if a.get('id') not in ids]
+            if rebuilt[:len(value)] != value or (len(rebuilt) > len(value)
+                                                  and not new.get('older')):
+                return None
+            delta.setdefault('prepend', {})[key] = added
+        else:
+            delta.setdefault('set', {})[key] = value
+    return delta
@@ -1,42 +1,16 @@
-"""Small helpers: QR codes, session codes, CSV safety, Jinja filters."""
+"""Small helpers: session codes, CSV safety, Jinja filters."""
 
-import base64
-import io
 import json
 import secrets
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional
 
-import qrcode as qr_code_lib
 from flask import current_app
-from PIL import Image
-from sqlalchemy import func
 
-from .models import Session
-
-
-def create_qr_code_data(url: str, size: int = 200) -> Optional[str]:
-    """Creates a QR code data URL for a given URL."""
-    try:
-        qr = qr_code_lib.QRCode(
-            version=1,
-            error_correction=qr_code_lib.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
-        # NEAREST keeps module edges hard — a smoothed QR blurs at projector size
-        # and scanners struggle with it.
-        img = qr.make_image(fill_color="black", back_color="white") \
-            .resize((size, size), Image.NEAREST)
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        return f"data:image/png;base64,{img_str}"
-    except Exception:
-        current_app.logger.exception("Error generating QR code")
-        return None
+from .extensions import db
+from .models import Session, normalize_session_code
 
 
 # Crockford-style alphabet: I, L and O are omitted so no character can be
@@ -45,26 +19,73 @@ def create_qr_code_data(url: str, size: int = 200) -> Optional[str]:
 # people, so one ambiguous glyph costs real class time.
 SESSION_CODE_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
 
-# Applied to typed codes, and to stored codes when matching. Lets someone who
-# types O for 0 in anyway, and keeps codes issued before the alphabet was
-# narrowed (which really can contain O/I/L) working.
-_CODE_CONFUSABLES = {'O': '0', 'I': '1', 'L': '1'}
+_LIVE_CODES_KEY = 'classpulse_live_codes'
+_MAX_LIVE_CODES = 1024
 
 
-def normalize_session_code(raw) -> str:
-    """Upper-case a typed session code and fold confusable glyphs onto the
-    canonical alphabet."""
-    return ''.join(_CODE_CONFUSABLES.get(ch, ch)
-                   for ch in (raw or '').strip().upper())
+def session_code_match(code: str):
+    """A filter expression matching `code` against the stored folded code, so
+    O/0 and I/L/1 confusion can't miss. Served by uq_session_code_normalized."""
+    return Session.code_normalized == normalize_session_code(code)
 
 
-def session_code_match(code: str):
-    """A filter expression matching `code` against Session.code with the same
-    folding applied to both sides, so O/0 and I/L/1 confusion can't miss."""
-    col = Session.code
-    for src, dst in _CODE_CONFUSABLES.items():
-        col = func.replace(col, src, dst)
-    return col == normalize_session_code(code)
+class _LiveCodes:
+    """Normalized code -> id of the live session it opens, most recent last.
+
+    Only a hint: live_session_by_code re-reads the session by primary key on a
+    hit, so a toggle made by another worker process can't be served stale.
+    """
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._ids = OrderedDict()
+
+    def get(self, code):
+        with self._lock:
+            session_id = self._ids.get(code)
+            if session_id is not None:
+                self._ids.move_to_end(code)
+            return session_id
+
+    def put(self, code, session_id):
+        with self._lock:
+            self._ids[code] = session_id
+            self._ids.move_to_end(code)
+            while len(self._ids) > self._capacity:
+                self._ids.popitem(last=False)
+
+    def discard(self, code):
+        with self._lock:
+            self._ids.pop(code, None)
+
+
+def live_session_by_code(code) -> Optional[Session]:
+    """The live session a typed `code` opens, or None. A dict hit plus a
+    primary-key read when the code was resolved before, an index lookup
+    otherwise."""
+    code = normalize_session_code(code)
+    if not code:
+        return None
+    cache = current_app.extensions[_LIVE_CODES_KEY]
+    session_id = cache.get(code)
+    if session_id is not None:
+        s = db.session.get(Session, session_id)
+        if s is not None and s.is_live and s.code_normalized == code:
+            return s
+        cache.discard(code)
+    s = Session.query.filter(
+        session_code_match(code), Session.active.is_(True),
+        Session.archived.is_(False), Session.deleted.is_(False)).first()
+    if s is not None:
+        cache.put(code, s.id)
+    return s
+
+
+def forget_session_code(code):
+    """Drop a session's code from the cache once the session stops being live
+    (toggle, archive, delete)."""
+    current_app.extensions[_LIVE_CODES_KEY].discard(normalize_session_code(code))
 
 
 def generate_session_code(length: int = 6) -> str:
@@ -77,6 +98,10 @@ def generate_session_code(length: int = 6) -> str:
             return code
 
 
+def init_app(app):
+    app.extensions[_LIVE_CODES_KEY] = _LiveCodes(_MAX_LIVE_CODES)
+
+
 def csv_safe(value) -> str:
     """Neutralise spreadsheet formula injection in CSV exports.
 
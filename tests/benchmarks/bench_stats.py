@@ -0,0 +1,228 @@
+"""Benchmarks for the result-aggregation hot paths.
+
+Seeds N synthetic responses for one question of every type in
+questions.VALID_QUESTION_TYPES, then times:
+
+  stats_cold     first get_question_stats (builds the aggregate from responses)
+  stats_reload   get_question_stats after the in-process tallies are dropped
+                 (a restart: reads the persisted aggregate tables)
+  stats_warm     get_question_stats with the tallies cached
+  broadcast      broadcast_results with coalescing off (stats + delta + emit)
+  export_csv     GET /questions/<id>/export
+  session_export GET /sessions/<id>/export, once per size over every type
+
+against in-memory and file-backed SQLite. Results are written as JSON, so
+two runs can be diffed or checked in CI. Not collected by pytest; run with
+
+    make bench
+    python tests/benchmarks/bench_stats.py --sizes 1000,10000 --out bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import insert  # noqa: E402
+
+from classpulse import aggregates, create_app  # noqa: E402
+from classpulse.auth import hash_password  # noqa: E402
+from classpulse.extensions import db  # noqa: E402
+from classpulse.models import Question, Response, Session, User  # noqa: E402
+from classpulse.questions import VALID_QUESTION_TYPES  # noqa: E402
+from classpulse.sockets import broadcast_results  # noqa: E402
+from classpulse.stats import get_question_stats  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DATABASES = ('memory', 'file')
+PASSWORD = 'bench-password-123'
+
+_OPTIONS = ['Red', 'Green', 'Blue', 'Yellow', 'Purple']
+_SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'vo', 'shi', 'pen', 'dar', 'sol', 'bix']
+
+
+def _question_options(q_type):
+    if q_type in ('multiple_choice', 'multi_select', 'ranking', 'multiple_choice_other'):
+        return _OPTIONS
+    if q_type == 'image_choice':
+        return [{'label': o, 'url': f'https://example.com/{o}.png'} for o in _OPTIONS]
+    if q_type == 'rating':
+        return {'max_rating': 5}
+    if q_type == 'numeric':
+        return {'min': 0.0, 'max': 100.0}
+    return {}
+
+
+def _vocabulary(rng, size=2000):
+    return [''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(size)]
+
+
+def _value(q_type, rng, vocab):
+    """One plausible stored response value for a question of `q_type`."""
+    if q_type in ('multiple_choice', 'image_choice'):
+        return rng.choice(_OPTIONS)
+    if q_type == 'multiple_choice_other':
+        return rng.choice(_OPTIONS) if rng.random() < 0.8 else ' '.join(rng.sample(vocab, 2))
+    if q_type == 'rating':
+        return str(rng.randint(1, 5))
+    if q_type == 'numeric':
+        return str(round(rng.uniform(0, 100), 1))
+    if q_type == 'multi_select':
+        return '\n'.join(rng.sample(_OPTIONS, rng.randint(1, len(_OPTIONS))))
+    if q_type == 'ranking':
+        return '\n'.join(rng.sample(_OPTIONS, len(_OPTIONS)))
+    # Free text: a Zipf-ish draw, so a few words dominate like real answers.
+    words = rng.choices(vocab, weights=[1 / (i + 1) for i in range(len(vocab))],
+                        k=1 if q_type == 'word_cloud' else rng.randint(5, 20))
+    return ' '.join(words)
+
+
+def _seed(app, n, seed):
+    """A user, a session and one question per type with `n` responses each.
+    Returns (session_id, {type: question_id})."""
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com',
+                    password_hash=hash_password(PASSWORD), display_name='bench',
+                    is_admin=False, is_verified=True, is_archived=False)
+        db.session.add(user)
+        db.session.flush()
+        s = Session(name='Benchmark', code='BENCH1', user_id=user.id, active=True)
+        db.session.add(s)
+        db.session.flush()
+        question_ids = {}
+        for order, q_type in enumerate(VALID_QUESTION_TYPES, 1):
+            q = Question(session_id=s.id, type=q_type, title=q_type, active=True, order=order,
+                         options=json.dumps(_question_options(q_type)))
+            db.session.add(q)
+            db.session.flush()
+            question_ids[q_type] = q.id
+            rows = [{'question_id': q.id, 'session_id': s.id,
+                     'response_value': _value(q_type, rng, vocab),
+                     'respondent_id': str(uuid.UUID(int=i)),
+                     'created_at': (start + timedelta(milliseconds=i)).isoformat()}
+                    for i in range(n)]
+            for i in range(0, n, 5000):
+                db.session.execute(insert(Response), rows[i:i + 5000])
+        db.session.commit()
+        return s.id, question_ids
+
+
+def _timed(repeats, fn, *args):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return {'median_s': statistics.median(samples), 'min_s': min(samples),
+            'repeats': repeats}
+
+
+def _restart_and_read(app, question_id):
+    aggregates.init_app(app)  # fresh, empty in-process tallies
+    get_question_stats(question_id)
+
+
+def _get_ok(client, url):
+    resp = client.get(url)
+    assert resp.status_code == 200, (url, resp.status_code)
+    resp.get_data()  # drain streamed bodies too
+
+
+def bench_one(database, n, repeats, seed=0):
+    """Benchmark records for one database kind at one response count."""
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = 'sqlite://' if database == 'memory' else f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = create_app({
+            'TESTING': True,
+            'SECRET_KEY': 'bench-secret-key',
+            'SQLALCHEMY_DATABASE_URI': uri,
+            'WTF_CSRF_ENABLED': False,
+            'RATELIMIT_ENABLED': False,
+            'RESULTS_BROADCAST_WINDOW_MS': 0,
+        })
+        session_id, question_ids = _seed(app, n, seed)
+        client = app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': PASSWORD})
+        records = []
+
+        def record(q_type, op, timing):
+            records.append({'db': database, 'responses': n, 'type': q_type, 'op': op, **timing})
+
+        with app.app_context():
+            for q_type, qid in question_ids.items():
+                record(q_type, 'stats_cold', _timed(1, get_question_stats, qid))
+                record(q_type, 'stats_reload', _timed(repeats, _restart_and_read, app, qid))
+                record(q_type, 'stats_warm', _timed(repeats, get_question_stats, qid))
+                record(q_type, 'broadcast', _timed(repeats, broadcast_results, qid))
+                db.session.remove()
+        for q_type, qid in question_ids.items():
+            record(q_type, 'export_csv',
+                   _timed(repeats, _get_ok, client, f'/questions/{qid}/export'))
+        record('*', 'session_export',
+               _timed(repeats, _get_ok, client, f'/sessions/{session_id}/export'))
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        return records
+
+
+def run(sizes=DEFAULT_SIZES, databases=DATABASES, repeats=5, seed=0):
+    """The full benchmark report as a JSON-serialisable dict."""
+    results = []
+    for database in databases:
+        for n in sizes:
+            results.extend(bench_one(database, n, repeats, seed))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'started': datetime.now(timezone.utc).isoformat(),
+            'sizes': list(sizes),
+            'repeats': repeats,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated response counts per question')
+    parser.add_argument('--db', default=','.join(DATABASES),
+                        help='comma-separated: memory, file')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+    databases = [d for d in args.db.split(',') if d]
+    unknown = set(databases) - set(DATABASES)
+    if unknown:
+        parser.error(f"unknown database kind(s): {', '.join(sorted(unknown))}")
+    report = run([int(s) for s in args.sizes.split(',') if s], databases,
+                 max(1, args.repeats), args.seed)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
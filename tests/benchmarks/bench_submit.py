@@ -0,0 +1,156 @@
+"""Submit-throughput benchmark: the SQLite tuning profile on vs off.
+
+Concurrent threads POST answers to /audience/respond against a file-backed
+SQLite database, as a synchronized "everyone vote now" burst would, once
+with SQLite's own defaults (SQLITE_PRAGMAS={}) and once with the tuning
+profile create_app applies by default. Reports submissions per second,
+latency percentiles and failed submissions for each, as JSON. Not collected
+by pytest; run with
+
+    make bench
+    python tests/benchmarks/bench_submit.py --threads 16 --per-thread 200
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from classpulse import create_app  # noqa: E402
+from classpulse.extensions import db  # noqa: E402
+from classpulse.models import Question, Session, User  # noqa: E402
+
+PROFILES = ('sqlite_defaults', 'tuned')
+_AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def _app(path, profile):
+    config = {
+        'TESTING': True,
+        'SECRET_KEY': 'bench-secret-key',
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'RESULTS_BROADCAST_WINDOW_MS': 0,
+    }
+    if profile == 'sqlite_defaults':
+        config['SQLITE_PRAGMAS'] = {}
+    return create_app(config)
+
+
+def _seed(app):
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x',
+                    display_name='bench', is_admin=False, is_verified=True, is_archived=False)
+        db.session.add(user)
+        db.session.flush()
+        s = Session(name='Benchmark', code='BENCH1', user_id=user.id, active=True)
+        db.session.add(s)
+        db.session.flush()
+        q = Question(session_id=s.id, type='multiple_choice', title='Vote', active=True,
+                     options=json.dumps(['A', 'B', 'C', 'D']))
+        db.session.add(q)
+        db.session.commit()
+        return q.id
+
+
+def _percentile(sorted_samples, q):
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+def bench_profile(profile, threads, per_thread):
+    """One burst against a fresh database under `profile`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = _app(os.path.join(tmp, 'submit.db'), profile)
+        qid = _seed(app)
+        latencies, failures = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(threads + 1)
+
+        def voter(n):
+            client = app.test_client()
+            mine, failed = [], 0
+            start.wait()
+            for i in range(per_thread):
+                client.set_cookie('classpulse_respondent', str(uuid.uuid4()))
+                began = time.perf_counter()
+                resp = client.post(f'/audience/respond/{qid}', headers=_AJAX,
+                                   data={f'response-{qid}': 'ABCD'[(n + i) % 4]})
+                mine.append(time.perf_counter() - began)
+                failed += resp.status_code != 200
+            with lock:
+                latencies.extend(mine)
+                failures.append(failed)
+
+        workers = [threading.Thread(target=voter, args=(n,)) for n in range(threads)]
+        for w in workers:
+            w.start()
+        start.wait()
+        began = time.perf_counter()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - began
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    latencies.sort()
+    total = threads * per_thread
+    return {
+        'profile': profile, 'threads': threads, 'submissions': total,
+        'failed': sum(failures), 'elapsed_s': elapsed,
+        'submissions_per_s': total / elapsed if elapsed else None,
+        'latency_p50_s': statistics.median(latencies) if latencies else None,
+        'latency_p95_s': _percentile(latencies, 0.95),
+        'latency_max_s': latencies[-1] if latencies else None,
+    }
+
+
+def run(threads=16, per_thread=100, profiles=PROFILES):
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'started': datetime.now(timezone.utc).isoformat(),
+            'threads': threads,
+            'per_thread': per_thread,
+        },
+        'results': [bench_profile(p, threads, per_thread) for p in profiles],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--per-thread', type=int, default=100)
+    parser.add_argument('--profiles', default=','.join(PROFILES),
+                        help=f"comma-separated: {', '.join(PROFILES)}")
+    parser.add_argument('--out', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+    profiles = [p for p in args.profiles.split(',') if p]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(sorted(unknown))}")
+    report = run(max(1, args.threads), max(1, args.per_thread), profiles)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
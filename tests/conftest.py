@@ -1,6 +1,10 @@
 import json
+import os
+import tempfile
+from contextlib import contextmanager
 
 import pytest
+from sqlalchemy import event
 
 from classpulse import create_app
 from classpulse.auth import hash_password
@@ -17,6 +21,8 @@ def make_app(extra_config=None):
         'SQLALCHEMY_DATABASE_URI': 'sqlite://',  # in-memory, StaticPool
         'WTF_CSRF_ENABLED': False,
         'RATELIMIT_ENABLED': False,
+        'RESULTS_BROADCAST_WINDOW_MS': 0,  # emit synchronously; tests opt in to coalescing
+        'QR_CACHE_DIR': os.path.join(tempfile.gettempdir(), 'classpulse-test-qr'),
     }
     if extra_config:
         config.update(extra_config)
@@ -86,3 +92,21 @@ def add_response(app, question_id, session_id, value, respondent_id):
 def join_session(client, code="ABC123"):
     """POST /join so the client picks up a respondent cookie."""
     return client.post('/join', data={'code': code})
+
+
+@contextmanager
+def count_queries(app):
+    """Collect the SQL statements run inside the block, to hold a handler to a
+    query budget: `with count_queries(app) as queries: ...; len(queries)`."""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
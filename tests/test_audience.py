@@ -4,7 +4,7 @@ import uuid
 from classpulse.models import Response
 
 from conftest import (
-    create_question, create_session, create_user, join_session
+    create_question, create_session, create_user, join_session, login
 )
 
 AJAX = {'X-Requested-With': 'XMLHttpRequest'}
@@ -65,6 +65,17 @@ def test_audience_view_accepts_confusable_substitutions(app, client):
     assert client.get('/audience/7ZOSGE').status_code == 200
 
 
+def test_deactivating_a_session_drops_its_cached_code(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=True)
+    assert client.get('/audience/ABC123').status_code == 200  # now cached
+    login(client, 'alice')
+    assert client.post(f'/api/sessions/{sid}/toggle').get_json()['active'] is False
+    assert client.get('/audience/ABC123').status_code == 302
+    client.post(f'/api/sessions/{sid}/toggle')
+    assert client.get('/audience/ABC123').status_code == 200
+
+
 def test_cold_visitor_to_join_link_lands_in_the_session(app, client):
     """A QR scan or shared link goes straight to /audience/<code> with no
     cookie yet. That must work, not bounce to the join form."""
@@ -167,6 +178,22 @@ def test_multi_select_rejects_foreign_values(app, client):
     assert resp.status_code == 400
 
 
+def test_ranking_needs_a_permutation_and_stores_options_in_rank_order(app, client):
+    sid, qid = setup_live(app, q_type='ranking')
+    join_session(client)
+
+    def rank(*ranks):
+        return client.post(f'/audience/respond/{qid}', headers=AJAX,
+                           data={f'rank-{qid}-{i}': r for i, r in enumerate(ranks)})
+
+    assert rank('1', '1', '3').status_code == 400
+    assert rank('1', '2').status_code == 400
+    assert rank('1', '2', '4').status_code == 400
+    resp = rank('2', '3', '1')
+    assert resp.status_code == 200
+    assert resp.get_json()['response_value'] == 'Blue\nRed\nGreen'
+
+
 def test_other_answer_length_cap(app, client):
     sid, qid = setup_live(app, q_type='multiple_choice_other')
     join_session(client)
@@ -184,6 +211,27 @@ def test_inactive_question_returns_conflict(app, client):
     assert resp.get_json()['inactive']
 
 
+def test_batch_submit_stores_every_valid_answer(app, client):
+    sid, choice = setup_live(app)
+    rating = create_question(app, sid, q_type='rating', options={'max_rating': 5})
+    closed = create_question(app, sid, active=False)
+    join_session(client)
+    resp = client.post('/audience/ABC123/respond', headers=AJAX, data={
+        f'response-{choice}': 'Red', f'response-{rating}': '9', f'response-{closed}': 'Red'})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert not body['success']
+    assert body['results'][str(choice)]['success']
+    assert 'between 1 and 5' in body['results'][str(rating)]['message']
+    assert body['results'][str(closed)]['inactive']
+    resp = client.post('/audience/ABC123/respond', headers=AJAX,
+                       data={f'response-{choice}': 'Blue', f'response-{rating}': '4'})
+    assert resp.get_json()['success']
+    with app.app_context():
+        stored = {r.question_id: r.response_value for r in Response.query.all()}
+    assert stored == {choice: 'Blue', rating: '4'}
+
+
 def test_forged_respondent_cookie_is_rejected(app, client):
     sid, qid = setup_live(app)
     client.set_cookie('classpulse_respondent', 'not-a-uuid')
@@ -210,3 +258,36 @@ def test_audience_view_replaces_a_malformed_respondent_cookie(app, client):
     issued = client.get_cookie('classpulse_respondent').value
     assert issued != 'not-a-uuid; DROP TABLE'
     uuid.UUID(issued)  # raises if the server didn't mint a real UUID
+
+
+def test_resubmitting_overwrites_the_single_response_row(app, client):
+    sid, qid = setup_live(app)
+    join_session(client)
+    for value in ('Red', 'Blue', 'Blue'):
+        assert _respond(client, qid, value).status_code == 200
+    with app.app_context():
+        rows = Response.query.filter_by(question_id=qid).all()
+        assert [r.response_value for r in rows] == ['Blue']
+
+
+def test_migration_dedupes_responses_before_adding_unique_index(app):
+    from sqlalchemy import inspect, text
+
+    from classpulse import _apply_additive_migrations
+    from classpulse.extensions import db
+    from classpulse.models import QuestionAggregate
+    from classpulse.stats import get_question_stats
+    sid, qid = setup_live(app)
+    with app.app_context():
+        db.session.execute(text('DROP INDEX uq_response_question_respondent'))
+        for value in ('Red', 'Green'):  # a double-submit from before the index
+            db.session.add(Response(question_id=qid, session_id=sid, response_value=value,
+                                    respondent_id='00000000-0000-4000-8000-000000000001'))
+        db.session.commit()
+        assert get_question_stats(qid)['total_responses'] == 2
+        _apply_additive_migrations(app)
+        assert 'uq_response_question_respondent' in {
+            ix['name'] for ix in inspect(db.engine).get_indexes('response')}
+        assert [r.response_value for r in Response.query.filter_by(question_id=qid)] == ['Green']
+        assert db.session.get(QuestionAggregate, qid) is None  # dropped, rebuilt on read
+        assert get_question_stats(qid)['results'] == {'Red': 0, 'Green': 1, 'Blue': 0}
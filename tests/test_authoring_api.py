@@ -48,6 +48,26 @@ def test_structural_edit_blocked_once_responses_exist(app, client):
         assert json.loads(q.options) == ['Red', 'Green', 'Blue']  # unchanged
 
 
+def test_edited_options_take_effect_for_validation(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    qid = create_question(app, sid)
+    audience = app.test_client()
+    audience.post('/join', data={'code': 'ABC123'})
+
+    def answer(value):
+        return audience.post(f'/audience/respond/{qid}', data={f'response-{qid}': value},
+                             headers={'X-Requested-With': 'XMLHttpRequest'}).status_code
+
+    assert answer('Purple') == 400  # compiles and caches the original options
+    login(client, 'alice')
+    assert client.post(f'/api/questions/{qid}/edit', json={
+        'type': 'multiple_choice', 'title': 'Pick', 'options': 'Purple\nOrange'}
+    ).get_json()['success']
+    assert answer('Red') == 400
+    assert answer('Purple') == 200
+
+
 def test_archive_and_delete_return_json(app, client):
     alice = create_user(app, 'alice')
     sid = create_session(app, alice)
@@ -0,0 +1,31 @@
+"""Smoke tests for the benchmark suite: each runs end to end and its JSON
+report has what it promises (tiny sizes only)."""
+
+import json
+
+from classpulse.questions import VALID_QUESTION_TYPES
+
+from benchmarks import bench_stats, bench_submit
+
+
+def test_benchmark_report_covers_every_type_and_op(tmp_path):
+    out = tmp_path / 'bench.json'
+    bench_stats.main(['--sizes', '20', '--db', 'memory,file', '--repeats', '1',
+                      '--out', str(out)])
+    report = json.loads(out.read_text())
+    assert report['meta']['sizes'] == [20]
+    seen = {(r['db'], r['type'], r['op']) for r in report['results']}
+    for db in ('memory', 'file'):
+        for q_type in VALID_QUESTION_TYPES:
+            for op in ('stats_cold', 'stats_reload', 'stats_warm', 'broadcast', 'export_csv'):
+                assert (db, q_type, op) in seen
+        assert (db, '*', 'session_export') in seen
+    assert all(r['median_s'] >= 0 for r in report['results'])
+
+
+def test_submit_benchmark_reports_both_profiles(tmp_path):
+    out = tmp_path / 'submit.json'
+    bench_submit.main(['--threads', '2', '--per-thread', '3', '--out', str(out)])
+    results = json.loads(out.read_text())['results']
+    assert [r['profile'] for r in results] == ['sqlite_defaults', 'tuned']
+    assert all(r['submissions'] == 6 and r['failed'] == 0 for r in results)
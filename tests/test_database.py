@@ -0,0 +1,94 @@
+"""Database setup: SQLite connection tuning and index migrations."""
+
+import pytest
+from sqlalchemy import text
+
+from classpulse.extensions import db
+
+from conftest import make_app
+
+
+def _pragma(app, name):
+    with app.app_context():
+        value = db.session.execute(text(f'PRAGMA {name}')).scalar()
+        db.session.remove()
+        return value
+
+
+def test_file_sqlite_gets_the_tuning_profile(tmp_path):
+    app = make_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'tuned.db'}"})
+    assert _pragma(app, 'journal_mode') == 'wal'
+    assert _pragma(app, 'synchronous') == 1  # NORMAL
+    assert _pragma(app, 'busy_timeout') == 5000
+    assert _pragma(app, 'temp_store') == 2  # MEMORY
+
+
+def test_tuning_can_be_disabled_and_bad_values_are_ignored(tmp_path):
+    app = make_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'plain.db'}",
+                    'SQLITE_PRAGMAS': {}})
+    assert _pragma(app, 'journal_mode') == 'delete'
+    app = make_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'odd.db'}",
+                    'SQLITE_PRAGMAS': {'synchronous': 'NORMAL; DROP TABLE user',
+                                       'busy_timeout': 1234}})
+    assert _pragma(app, 'synchronous') == 2  # untouched default FULL
+    assert _pragma(app, 'busy_timeout') == 1234
+
+
+def test_migration_creates_declared_indexes_missing_from_existing_tables(app):
+    from sqlalchemy import inspect
+
+    from classpulse import _apply_additive_migrations
+    declared = {ix.name: table.name for table in db.metadata.sorted_tables
+                for ix in table.indexes}
+    assert {'ix_response_question_created', 'ix_session_user_deleted',
+            'ix_proposal_session_status', 'ix_email_code_user_purpose'} <= set(declared)
+    with app.app_context():
+        for name in ('ix_response_question_created', 'ix_session_user_deleted'):
+            db.session.execute(text(f'DROP INDEX {name}'))
+        db.session.commit()
+        _apply_additive_migrations(app)
+        inspector = inspect(db.engine)
+        for name, table in declared.items():
+            assert name in {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def test_migration_backfills_normalized_session_codes(app):
+    from classpulse import _apply_additive_migrations
+    from classpulse.models import Session
+
+    from conftest import create_session, create_user
+    with app.app_context():
+        db.session.execute(text('DROP INDEX uq_session_code_normalized'))
+        db.session.commit()
+    alice = create_user(app, 'alice')
+    # Three codes that fold together: the live one keeps the folded code,
+    # however old the archived one and new the deleted one.
+    archived = create_session(app, alice, code='7ZOSGE', archived=True)
+    live = create_session(app, alice, code='7Z0SGE')
+    deleted = create_session(app, alice, code='7zosge', deleted=True)
+    # With none live, the newest keeps it.
+    older = create_session(app, alice, code='AB1CDE', active=False)
+    newer = create_session(app, alice, code='ABICDE', archived=True)
+    with app.app_context():
+        db.session.execute(text('UPDATE session SET code_normalized = NULL'))
+        db.session.commit()
+        _apply_additive_migrations(app)
+        folded = {sid: db.session.get(Session, sid).code_normalized
+                  for sid in (archived, live, deleted, older, newer)}
+    assert folded == {archived: None, live: '7Z0SGE', deleted: None,
+                      older: None, newer: 'AB1CDE'}
+
+
+def test_migration_stops_when_a_unique_index_cannot_be_built(app):
+    from classpulse import _apply_additive_migrations
+
+    from conftest import create_session, create_user
+    alice = create_user(app, 'alice')
+    create_session(app, alice, code='ABC123')
+    create_session(app, alice, code='XYZ789')
+    with app.app_context():
+        db.session.execute(text('DROP INDEX uq_session_code_normalized'))
+        db.session.execute(text("UPDATE session SET code_normalized = 'ABC123'"))
+        db.session.commit()
+        with pytest.raises(RuntimeError, match='uq_session_code_normalized'):
+            _apply_additive_migrations(app)
@@ -0,0 +1,113 @@
+"""Response exports: streamed, chunked, in a stable order."""
+
+import csv
+import io
+import json
+
+import pytest
+
+from classpulse import exports
+
+from conftest import add_response, create_question, create_session, create_user, login
+
+
+def test_session_export_streams_every_row_across_pages(app, client, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_CHUNK_ROWS', 3)
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    first, second = create_question(app, sid), create_question(app, sid)
+    for i in range(7):
+        # Interleaved, so only the export's ordering groups them by question.
+        add_response(app, second, sid, 'Blue', f'00000000-0000-4000-8000-{i:012d}')
+        add_response(app, first, sid, 'Red', f'00000000-0000-4000-8000-{i:012d}')
+    login(client, 'alice')
+
+    resp = client.get(f'/sessions/{sid}/export')
+    assert resp.status_code == 200 and resp.is_streamed
+    assert 'attachment' in resp.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert len(rows) == 14
+    assert len({r['response_id'] for r in rows}) == 14
+    assert [int(r['question_id']) for r in rows] == [first] * 7 + [second] * 7
+    ids = [int(r['response_id']) for r in rows[:7]]
+    assert ids == sorted(ids)
+
+
+def test_export_of_exactly_one_page_has_header_and_rows(app, client, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_CHUNK_ROWS', 2)
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    qid = create_question(app, sid)
+    for i in range(2):
+        add_response(app, qid, sid, 'Red', f'00000000-0000-4000-8000-{i:012d}')
+    login(client, 'alice')
+    lines = client.get(f'/questions/{qid}/export').get_data(as_text=True).splitlines()
+    assert lines[0] == ','.join(exports.CSV_FIELDS)
+    assert len(lines) == 3
+
+
+def _session_with_lists(app):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    multi = create_question(app, sid, q_type='multi_select')
+    rating = create_question(app, sid, q_type='rating', options={'max_rating': 5})
+    add_response(app, multi, sid, 'Red\nBlue', '00000000-0000-4000-8000-000000000001')
+    add_response(app, rating, sid, '4', '00000000-0000-4000-8000-000000000001')
+    return sid, multi, rating
+
+
+def test_ndjson_export_explodes_lists_and_types_numbers(app, client):
+    sid, multi, rating = _session_with_lists(app)
+    login(client, 'alice')
+    resp = client.get(f'/sessions/{sid}/export?format=ndjson')
+    assert resp.mimetype == 'application/x-ndjson'
+    assert resp.headers['Content-Disposition'].endswith('.ndjson')
+    records = {r['question_id']: r for r in map(json.loads, resp.get_data(as_text=True).splitlines())}
+    assert records[multi]['values'] == ['Red', 'Blue'] and records[multi]['number'] is None
+    assert records[rating]['number'] == 4.0 and records[rating]['values'] is None
+    assert records[rating]['question_type'] == 'rating'
+
+
+def test_parquet_export_has_typed_columns(app, client):
+    pq = pytest.importorskip('pyarrow.parquet')
+    sid, multi, rating = _session_with_lists(app)
+    login(client, 'alice')
+    resp = client.get(f'/sessions/{sid}/export?format=parquet')
+    assert resp.status_code == 200
+    table = pq.read_table(io.BytesIO(resp.get_data()))
+    rows = {r['question_id']: r for r in table.to_pylist()}
+    assert rows[multi]['values'] == ['Red', 'Blue']
+    assert rows[rating]['number'] == 4.0
+    assert str(table.schema.field('number').type) == 'double'
+
+
+def test_parquet_export_without_pyarrow_explains_itself(app, client, monkeypatch):
+    monkeypatch.setattr(exports, '_pyarrow', lambda: None)
+    sid, _, _ = _session_with_lists(app)
+    login(client, 'alice')
+    resp = client.get(f'/sessions/{sid}/export?format=parquet', follow_redirects=True)
+    assert b'pyarrow' in resp.data
+
+
+def test_wide_export_pivots_to_a_row_per_respondent(app, client, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_CHUNK_ROWS', 2)  # a respondent spans pages
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    first = create_question(app, sid, title='=Colour')
+    second = create_question(app, sid, title='Size')
+    people = [f'00000000-0000-4000-8000-{i:012d}' for i in range(3)]
+    add_response(app, second, sid, 'Big', people[2])
+    add_response(app, first, sid, 'Red', people[0])
+    add_response(app, second, sid, 'Small', people[0])
+    add_response(app, first, sid, '=1+1', people[1])
+    login(client, 'alice')
+
+    resp = client.get(f'/sessions/{sid}/export?format=wide')
+    assert resp.headers['Content-Disposition'].endswith('_wide.csv')
+    rows = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+    assert rows == [
+        ['respondent_id', 'Q1: =Colour', 'Q2: Size'],
+        [people[0], 'Red', 'Small'],
+        [people[1], "'=1+1", ''],
+        [people[2], '', 'Big'],
+    ]
@@ -0,0 +1,37 @@
+"""Join-link QR codes: drawn once, served as immutable cacheable images."""
+
+import re
+
+from conftest import create_session, create_user, login, make_app
+
+
+def _qr_url(client, sid):
+    page = client.get(f'/present/{sid}').get_data(as_text=True)
+    match = re.search(r'src="(/qr/[0-9a-f]{64}\.png)"', page)
+    assert match, "present mode should link the QR image, not inline it"
+    return match.group(1)
+
+
+def test_present_mode_serves_qr_as_immutable_image(tmp_path):
+    app = make_app({'QR_CACHE_DIR': str(tmp_path)})
+    client = app.test_client()
+    sid = create_session(app, create_user(app, 'alice'))
+    login(client, 'alice')
+    url = _qr_url(client, sid)
+    assert 'data:image/png' not in client.get(f'/present/{sid}').get_data(as_text=True)
+
+    resp = client.get(url)
+    assert resp.status_code == 200 and resp.mimetype == 'image/png'
+    assert resp.data.startswith(b'\x89PNG')
+    assert 'immutable' in resp.headers['Cache-Control']
+    etag = resp.headers['ETag']
+    assert not etag.startswith('W/')
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # Another process finds it on disk rather than redrawing it.
+    assert make_app({'QR_CACHE_DIR': str(tmp_path)}).test_client().get(url).status_code == 200
+
+
+def test_qr_route_only_serves_drawn_images(app, client):
+    assert client.get(f"/qr/{'0' * 64}.png").status_code == 404
+    assert client.get('/qr/..%2Fsecret.png').status_code == 404
@@ -0,0 +1,79 @@
+"""Query budgets for the hot handlers: each runs a fixed number of SQL
+statements however many questions its session holds."""
+
+import pytest
+
+from classpulse.extensions import socketio
+
+from conftest import (
+    count_queries, create_question, create_session, create_user, join_session, login
+)
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def _live_session(app, n_questions):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    qids = [create_question(app, sid, title=f'Q{i}') for i in range(n_questions)]
+    return sid, qids
+
+
+def _resubmit_queries(app, client, qid):
+    client.post(f'/audience/respond/{qid}', data={f'response-{qid}': 'Red'}, headers=AJAX)
+    with count_queries(app) as queries:
+        resp = client.post(f'/audience/respond/{qid}', data={f'response-{qid}': 'Blue'},
+                           headers=AJAX)
+    assert resp.status_code == 200
+    return len(queries)
+
+
+@pytest.mark.parametrize('n_questions', [1, 12])
+def test_process_response_budget(app, client, n_questions):
+    _, qids = _live_session(app, n_questions)
+    join_session(client)
+    # Question+session, write lock, previous answer, tallies, upsert, the
+    # broadcast's stats read.
+    assert _resubmit_queries(app, client, qids[0]) <= 10
+
+
+@pytest.mark.parametrize('n_questions', [1, 12])
+def test_audience_view_budget(app, client, n_questions):
+    _live_session(app, n_questions)
+    join_session(client)
+    with count_queries(app) as queries:
+        assert client.get('/audience/ABC123').status_code == 200
+    # Session by code, its questions, this respondent's previous answers.
+    assert len(queries) == 3
+
+
+@pytest.mark.parametrize('n_questions', [1, 12])
+def test_socket_join_and_toggle_budget(app, client, n_questions):
+    sid, qids = _live_session(app, n_questions)
+    ws = socketio.test_client(app, flask_test_client=client)
+    with count_queries(app) as queries:
+        ws.emit('join', {'question_id': qids[-1]})
+    # Question with its session (one SELECT), then building its tallies cold.
+    assert len(queries) <= 5
+    login(client, 'alice')
+    with count_queries(app) as queries:
+        assert client.post(f'/api/sessions/{sid}/toggle').status_code == 200
+    # User, session, the update, the session's refresh after commit, then
+    # questions_changed's two narrow reads.
+    assert len(queries) <= 6
+
+
+@pytest.mark.parametrize('n_sessions', [1, 15])
+def test_dashboard_budget(app, client, n_sessions):
+    alice = create_user(app, 'alice')
+    sids = [create_session(app, alice, code=f'ABC{i:03d}') for i in range(n_sessions)]
+    for sid in sids:
+        for i in range(3):
+            create_question(app, sid, title=f'Q{i}')
+    login(client, 'alice')
+    with count_queries(app) as queries:
+        resp = client.get(f'/sessions/{sids[0]}')
+    assert resp.status_code == 200
+    # User, the ownership check, sessions, grouped question counts, then the
+    # selected session's questions and their grouped response counts.
+    assert len(queries) <= 6
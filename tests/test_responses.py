@@ -0,0 +1,95 @@
+"""Opt-in write-behind: queued responses count live, then land in one commit."""
+
+import time
+
+from classpulse.extensions import db
+from classpulse.models import Response
+from classpulse import responses
+from classpulse.responses import flush_responses
+from classpulse.stats import get_question_stats
+
+from conftest import create_question, create_session, create_user, make_app
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def _buffered_app(**config):
+    # A long window so nothing flushes on its own unless a test wants it to.
+    app = make_app({'RESPONSE_WRITE_BEHIND_MS': 60000, **config})
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    return app, create_question(app, sid)
+
+
+def _voter(app):
+    c = app.test_client()
+    c.post('/join', data={'code': 'ABC123'})
+    return c
+
+
+def _vote(client, qid, value):
+    resp = client.post(f'/audience/respond/{qid}', data={f'response-{qid}': value}, headers=AJAX)
+    assert resp.status_code == 200
+
+
+def _teardown(app):
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_buffered_responses_count_before_and_after_flush():
+    app, qid = _buffered_app()
+    fickle = _voter(app)
+    _vote(fickle, qid, 'Red')
+    _vote(_voter(app), qid, 'Red')
+    _vote(fickle, qid, 'Blue')  # replaces a still-queued answer
+    with app.app_context():
+        assert Response.query.count() == 0
+        live = get_question_stats(qid)
+        assert live['total_responses'] == 2
+        assert live['results'] == {'Red': 1, 'Green': 0, 'Blue': 1}
+        flush_responses()
+        assert sorted(r.response_value for r in Response.query) == ['Blue', 'Red']
+        assert get_question_stats(qid)['results'] == live['results']  # not double-counted
+    _teardown(app)
+
+
+def test_flushed_responses_are_counted_once_as_soon_as_they_commit(monkeypatch):
+    app, qid = _buffered_app()
+    _vote(_voter(app), qid, 'Red')
+    seen = []
+    write = responses._ResponseBuffer._write
+
+    def write_and_look(self, batch, settled):
+        write(self, batch, settled)
+        # Committed, but flush() hasn't finished: readers must not see the
+        # answer both written and still held.
+        seen.append(get_question_stats(qid)['total_responses'])
+
+    monkeypatch.setattr(responses._ResponseBuffer, '_write', write_and_look)
+    with app.app_context():
+        flush_responses()
+        assert seen == [1]
+        assert get_question_stats(qid)['total_responses'] == 1
+    _teardown(app)
+
+
+def test_full_buffer_flushes_without_waiting_for_the_window(tmp_path):
+    # File-backed: the background writer needs its own connection, not the
+    # single one an in-memory database shares across threads.
+    app, qid = _buffered_app(RESPONSE_WRITE_BEHIND_MAX_ROWS=2,
+                             SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'wb.db'}")
+    _vote(_voter(app), qid, 'Red')
+    _vote(_voter(app), qid, 'Green')
+    with app.app_context():
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if (Response.query.count() == 2
+                    and get_question_stats(qid)['total_responses'] == 2):
+                break
+            db.session.remove()
+            time.sleep(0.05)
+        assert Response.query.count() == 2
+        assert get_question_stats(qid)['results'] == {'Red': 1, 'Green': 1, 'Blue': 0}
+    _teardown(app)
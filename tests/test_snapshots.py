@@ -0,0 +1,99 @@
+"""Archived sessions serve their results from a frozen snapshot."""
+
+from classpulse.aggregates import delete_for_questions
+from classpulse.extensions import db, socketio
+from classpulse.models import SessionSnapshot
+
+from conftest import (
+    add_response, count_queries, create_question, create_session, create_user, login
+)
+
+PEOPLE = [f'00000000-0000-4000-8000-{i:012d}' for i in range(3)]
+
+
+def _results(client, sid):
+    return client.get(f'/api/sessions/{sid}/results').get_json()['results']
+
+
+def test_archive_freezes_results_and_unarchive_drops_them(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    qid = create_question(app, sid)
+    add_response(app, qid, sid, 'Red', PEOPLE[0])
+    login(client, 'alice')
+    assert client.post(f'/api/sessions/{sid}/archive').get_json()['archived']
+    with app.app_context():
+        assert db.session.get(SessionSnapshot, sid) is not None
+
+    # Rows written behind the snapshot's back don't show: it's what's served.
+    add_response(app, qid, sid, 'Blue', PEOPLE[1])
+    with count_queries(app) as queries:
+        frozen = _results(client, sid)
+    assert frozen[str(qid)]['total_responses'] == 1
+    assert len(queries) <= 3  # user, session, snapshot
+
+    client.post(f'/api/sessions/{sid}/archive')  # unarchive
+    with app.app_context():
+        assert db.session.get(SessionSnapshot, sid) is None
+
+
+def test_session_archived_before_snapshots_is_frozen_on_first_read(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=False, archived=True)
+    qid = create_question(app, sid)
+    add_response(app, qid, sid, 'Green', PEOPLE[0])
+    login(client, 'alice')
+    assert _results(client, sid)[str(qid)]['results']['Green'] == 1
+    with app.app_context():
+        assert db.session.get(SessionSnapshot, sid) is not None
+
+
+def test_socket_joins_on_archived_session_get_frozen_stats(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    qid = create_question(app, sid)
+    add_response(app, qid, sid, 'Red', PEOPLE[0])
+    login(client, 'alice')
+    client.post(f'/api/sessions/{sid}/archive')
+    add_response(app, qid, sid, 'Blue', PEOPLE[1])
+
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join_session_results', {'session_id': sid})
+    ws.emit('join', {'question_id': qid})
+    received = ws.get_received()
+    [batch] = [r['args'][0] for r in received if r['name'] == 'session_results']
+    assert batch['results'][str(qid)]['total_responses'] == 1
+    [single] = [r['args'][0] for r in received if r['name'] == 'update_results']
+    assert single['stats']['total_responses'] == 1
+
+
+def test_freezing_twice_overwrites_the_one_snapshot(app):
+    from classpulse.models import Session
+    from classpulse.snapshots import freeze_session, session_stats
+
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=False, archived=True)
+    qid = create_question(app, sid)
+    add_response(app, qid, sid, 'Red', PEOPLE[0])
+    with app.app_context():
+        # Two first reads racing each freeze the session; neither may fail.
+        first = freeze_session(db.session.get(Session, sid))
+        assert freeze_session(db.session.get(Session, sid)) == first
+        assert SessionSnapshot.query.filter_by(session_id=sid).count() == 1
+        assert session_stats(db.session.get(Session, sid))[qid]['total_responses'] == 1
+
+
+def test_archived_question_results_page_renders_the_snapshot(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    qid = create_question(app, sid)
+    add_response(app, qid, sid, 'Red', PEOPLE[0])
+    login(client, 'alice')
+    client.post(f'/api/sessions/{sid}/archive')
+    add_response(app, qid, sid, 'Blue', PEOPLE[1])
+    with app.app_context():
+        # Recomputing would now rebuild the tallies from both rows.
+        delete_for_questions([qid])
+        db.session.commit()
+    page = client.get(f'/questions/{qid}/results').get_data(as_text=True)
+    assert 'Total Responses: 1' in page
@@ -1,6 +1,7 @@
 """Socket.IO room authorization: live results must not leak to strangers."""
 
 from classpulse.extensions import socketio
+from classpulse.stats import encode_cursor
 
 from conftest import add_response, create_question, create_session, create_user, login
 
@@ -78,3 +79,122 @@ def test_garbage_join_payloads_ignored(app, client):
     ws.emit('join_session', {'session_id': [1, 2]})
     ws.emit('leave', {'question_id': None})
     assert ws.is_connected()
+
+
+def test_burst_of_responses_coalesced_into_one_broadcast():
+    import time
+
+    from classpulse.extensions import db
+    from conftest import make_app
+
+    app = make_app({'RESULTS_BROADCAST_WINDOW_MS': 500})
+    client = app.test_client()
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=True)
+    qid = create_question(app, sid)
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join', {'question_id': qid})
+    ws.get_received()
+    for _ in range(5):
+        voter = app.test_client()
+        voter.post('/join', data={'code': 'ABC123'})
+        voter.post(f'/audience/respond/{qid}', data={f'response-{qid}': 'Red'},
+                   headers={'X-Requested-With': 'XMLHttpRequest'})
+    time.sleep(1.0)
+    updates = _updates(ws.get_received())
+    assert len(updates) == 1
+    assert updates[0]['args'][0]['stats']['total_responses'] == 5
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_later_updates_carry_only_the_delta(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=True)
+    qid = create_question(app, sid)
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join', {'question_id': qid})
+    snapshot = _updates(ws.get_received())[0]['args'][0]
+    assert snapshot['stats']['results'] == {'Red': 0, 'Green': 0, 'Blue': 0}
+    for value in ('Red', 'Blue'):
+        voter = app.test_client()
+        voter.post('/join', data={'code': 'ABC123'})
+        voter.post(f'/audience/respond/{qid}', data={f'response-{qid}': value},
+                   headers={'X-Requested-With': 'XMLHttpRequest'})
+    first, second = [u['args'][0] for u in _updates(ws.get_received())]
+    # The room's first broadcast is a snapshot; the next one builds on it.
+    assert 'stats' in first
+    assert 'stats' not in second and second['base_version'] == first['stats']['version']
+    assert second['delta']['merge'] == {'results': {'Blue': 1}}
+    assert second['delta']['set'] == {'total_responses': 2}
+
+
+def test_results_feed_never_moves_a_room_backwards():
+    from classpulse.sockets import _ResultsFeed
+
+    def stats(version, red):
+        return {'version': version, 'total_responses': red, 'results': {'Red': red}}
+
+    feed = _ResultsFeed(8)
+    assert feed.payload(1, stats(6, 6))['stats']['version'] == 6
+    # A computation that read version 5 finishing after the version 6 one.
+    assert feed.payload(1, stats(5, 5)) is None
+    update = feed.payload(1, stats(7, 7))
+    assert (update['base_version'], update['version']) == (6, 7)
+
+
+def test_request_snapshot_respects_room_authorization(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=False)
+    qid = create_question(app, sid)
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('request_snapshot', {'question_id': qid})
+    assert not _updates(ws.get_received())
+
+
+def test_answers_since_returns_only_newer_answers(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=True)
+    qid = create_question(app, sid, q_type='short_answer', options=[])
+    add_response(app, qid, sid, 'first', '00000000-0000-4000-8000-000000000001')
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join', {'question_id': qid})
+    seen = _updates(ws.get_received())[0]['args'][0]['stats']['results']
+    add_response(app, qid, sid, 'second', '00000000-0000-4000-8000-000000000002')
+    ws.emit('answers_since', {'question_id': qid, 'cursor': encode_cursor(seen[0])})
+    pages = [r['args'][0] for r in ws.get_received() if r['name'] == 'answers']
+    assert [a['text'] for a in pages[0]['answers']] == ['second']
+
+
+def test_join_session_results_snapshots_every_question_at_once(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=True)
+    q1 = create_question(app, sid)
+    q2 = create_question(app, sid, q_type='rating', options={'max_rating': 5})
+    create_question(app, sid, active=False)
+    add_response(app, q1, sid, 'Red', '00000000-0000-4000-8000-000000000000')
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join_session_results', {'session_id': sid})
+    [event] = [r for r in ws.get_received() if r['name'] == 'session_results']
+    results = event['args'][0]['results']
+    assert set(results) == {str(q1), str(q2)}  # strangers don't see inactive ones
+    assert results[str(q1)]['results']['Red'] == 1
+    assert results[str(q2)]['max_rating'] == 5
+    # ...and the rooms were joined, so live updates follow.
+    voter = app.test_client()
+    voter.post('/join', data={'code': 'ABC123'})
+    voter.post(f'/audience/respond/{q2}', data={f'response-{q2}': '4'},
+               headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert [u['args'][0]['question_id'] for u in _updates(ws.get_received())] == [q2]
+
+
+def test_join_session_results_refused_for_strangers_when_not_live(app, client):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice, active=False)
+    create_question(app, sid)
+    ws = socketio.test_client(app, flask_test_client=client)
+    ws.emit('join_session_results', {'session_id': sid})
+    assert not ws.get_received()
+    login(client, 'alice')
+    assert client.get(f'/api/sessions/{sid}/results').get_json()['success']
@@ -0,0 +1,238 @@
+"""Result stats: running tallies must agree with the raw responses."""
+
+from werkzeug.datastructures import MultiDict
+
+from classpulse.extensions import db
+from classpulse.models import QuestionAggregate, QuestionTally
+from classpulse.stats import get_question_stats
+
+from conftest import add_response, create_question, create_session, create_user, login
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def _respond(app, qid, data):
+    """Submit one answer as a fresh audience member; returns their client."""
+    c = app.test_client()
+    c.post('/join', data={'code': 'ABC123'})
+    assert c.post(f'/audience/respond/{qid}', data=data, headers=AJAX).status_code == 200
+    return c
+
+
+def _stats(app, qid):
+    with app.app_context():
+        return get_question_stats(qid)
+
+
+def _forget_in_memory(app):
+    """Simulate a restart: drop the in-process tallies, keep the tables."""
+    from classpulse import aggregates
+    app.extensions['classpulse_tallies'] = aggregates._TallyCache(16)
+
+
+def setup_live(app, **q_kwargs):
+    alice = create_user(app, 'alice')
+    sid = create_session(app, alice)
+    return sid, create_question(app, sid, **q_kwargs)
+
+
+def test_multiple_choice_tallies_follow_overwrites(app):
+    sid, qid = setup_live(app)
+    voter = _respond(app, qid, {f'response-{qid}': 'Red'})
+    _respond(app, qid, {f'response-{qid}': 'Red'})
+    voter.post(f'/audience/respond/{qid}', data={f'response-{qid}': 'Blue'}, headers=AJAX)
+    stats = _stats(app, qid)
+    assert stats['total_responses'] == 2
+    assert stats['results'] == {'Red': 1, 'Green': 0, 'Blue': 1}
+
+
+def test_tallies_survive_restart(app):
+    sid, qid = setup_live(app, q_type='rating', options={'max_rating': 5})
+    _respond(app, qid, {f'response-{qid}': '4'})
+    _respond(app, qid, {f'response-{qid}': '4'})
+    _forget_in_memory(app)
+    stats = _stats(app, qid)
+    assert stats['results']['4'] == 2 and stats['total_responses'] == 2
+
+
+def test_existing_responses_backfilled_on_first_read(app):
+    sid, qid = setup_live(app, q_type='multi_select')
+    add_response(app, qid, sid, 'Red\nBlue', '00000000-0000-4000-8000-000000000001')
+    add_response(app, qid, sid, 'Blue', '00000000-0000-4000-8000-000000000002')
+    assert _stats(app, qid)['results'] == {'Red': 1, 'Green': 0, 'Blue': 2}
+    with app.app_context():
+        assert db.session.get(QuestionAggregate, qid).total_responses == 2
+
+
+def test_ranking_average_positions(app):
+    sid, qid = setup_live(app, q_type='ranking')
+    # Red first, Green second, Blue third — then the reverse.
+    _respond(app, qid, {f'rank-{qid}-0': '1', f'rank-{qid}-1': '2', f'rank-{qid}-2': '3'})
+    c = _respond(app, qid, {f'rank-{qid}-0': '3', f'rank-{qid}-1': '2', f'rank-{qid}-2': '1'})
+    assert _stats(app, qid)['results'] == {'Red': 2.0, 'Green': 2.0, 'Blue': 2.0}
+    c.post(f'/audience/respond/{qid}', headers=AJAX,
+           data={f'rank-{qid}-0': '1', f'rank-{qid}-1': '3', f'rank-{qid}-2': '2'})
+    assert _stats(app, qid)['results'] == {'Red': 1.0, 'Green': 2.5, 'Blue': 2.5}
+
+
+def test_other_answers_fold_into_one_bucket(app):
+    sid, qid = setup_live(app, q_type='multiple_choice_other')
+    _respond(app, qid, {f'response-{qid}': '__other__', f'response-{qid}-other': 'Teal'})
+    _respond(app, qid, {f'response-{qid}': '__other__', f'response-{qid}-other': 'Mauve'})
+    _respond(app, qid, MultiDict([(f'response-{qid}', 'Green')]))
+    stats = _stats(app, qid)
+    assert stats['results'] == {'Red': 0, 'Green': 1, 'Blue': 0, 'Other': 2}
+
+
+def test_deleting_question_removes_its_tallies(app, client):
+    sid, qid = setup_live(app)
+    _stats(app, qid)  # builds the (empty) aggregate
+    login(client, 'alice')
+    assert client.post(f'/api/questions/{qid}/delete').get_json()['success']
+    with app.app_context():
+        assert db.session.get(QuestionAggregate, qid) is None
+        assert QuestionTally.query.filter_by(question_id=qid).count() == 0
+
+
+def test_value_counts_grouped_by_database(app):
+    from classpulse.aggregates import value_counts
+    sid, qid = setup_live(app, q_type='word_cloud', options={})
+    for i, word in enumerate(['tea', 'tea', 'coffee']):
+        add_response(app, qid, sid, word, f'00000000-0000-4000-8000-00000000000{i}')
+    with app.app_context():
+        assert sorted(value_counts(qid)) == [('coffee', 1), ('tea', 2)]
+    cloud = {w['text']: w['weight'] for w in _stats(app, qid)['results']}
+    assert cloud == {'tea': 2, 'coffee': 1}
+
+
+def test_repeated_combinations_weighted_when_backfilled(app):
+    sid, qid = setup_live(app, q_type='ranking')
+    for i in range(3):
+        add_response(app, qid, sid, 'Blue\nRed\nGreen', f'00000000-0000-4000-8000-00000000000{i}')
+    add_response(app, qid, sid, 'Red\nBlue\nGreen', '00000000-0000-4000-8000-000000000009')
+    stats = _stats(app, qid)
+    assert stats['total_responses'] == 4
+    assert stats['results'] == {'Red': 1.75, 'Green': 3.0, 'Blue': 1.25}
+
+
+def test_stats_delta_sections():
+    from classpulse.stats import stats_delta
+    old = {'type': 'short_answer', 'version': 1, 'total_responses': 1,
+           'results': [{'id': 1, 'text': 'b', 'ts': '1'}],
+           'cloud': [{'text': 'b', 'weight': 1}]}
+    new = {'type': 'short_answer', 'version': 2, 'total_responses': 2,
+           'results': [{'id': 2, 'text': 'a b', 'ts': '2'}, {'id': 1, 'text': 'b', 'ts': '1'}],
+           'cloud': [{'text': 'b', 'weight': 2}, {'text': 'a', 'weight': 1}]}
+    assert stats_delta(old, new) == {
+        'set': {'total_responses': 2},
+        'prepend': {'results': [{'id': 2, 'text': 'a b', 'ts': '2'}]},
+        'weights': {'cloud': {'a': 1, 'b': 2}},
+    }
+    # A rewritten answer keeps its id and moves to the front.
+    rewritten = dict(new, results=[{'id': 1, 'text': 'c', 'ts': '3'},
+                                   {'id': 2, 'text': 'a b', 'ts': '2'}])
+    assert stats_delta(new, rewritten)['prepend'] == {'results': [{'id': 1, 'text': 'c', 'ts': '3'}]}
+    # Answers vanishing from the page can't be expressed as a delta.
+    assert stats_delta(new, dict(new, results=[])) is None
+
+
+def test_word_counts_follow_overwritten_answers(app):
+    sid, qid = setup_live(app, q_type='short_answer', options={})
+    c = _respond(app, qid, {f'response-{qid}': 'Photosynthesis needs light!'})
+    _respond(app, qid, {f'response-{qid}': 'light and water'})
+    c.post(f'/audience/respond/{qid}', data={f'response-{qid}': 'chlorophyll'}, headers=AJAX)
+    cloud = {w['text']: w['weight'] for w in _stats(app, qid)['cloud']}
+    assert cloud == {'light': 1, 'water': 1, 'chlorophyll': 1}
+    with app.app_context():
+        assert QuestionTally.query.filter_by(question_id=qid, bucket='needs').one().count == 0
+
+
+def test_space_saving_sketch_keeps_heavy_hitters():
+    from classpulse.aggregates import Tallies
+    t = Tallies(0, 0, capacity=6)
+    stream = ['a'] * 50 + ['b'] * 30 + [f'noise{i}' for i in range(40)] + ['c'] * 20
+    for word in stream:
+        t.add(word, 1, 0.0)
+    assert len(t.counts) == 6
+    # Anything seen more than N/capacity times is guaranteed to be tracked,
+    # and counts only ever over-estimate.
+    assert t.counts['a'] >= 50 and t.counts['b'] >= 30
+    t.add('a', -10, 0.0)
+    t.add('never-seen', -1, 0.0)
+    assert t.counts['a'] >= 40 and 'never-seen' not in t.counts
+
+
+def test_live_word_cloud_capped_but_results_page_exact():
+    from conftest import make_app
+    app = make_app({'WORD_CLOUD_TOP_K': 2})
+    sid, qid = setup_live(app, q_type='word_cloud', options={})
+    for answer in ('apple', 'apple', 'apple', 'banana', 'banana', 'cherry', 'damson'):
+        _respond(app, qid, {f'response-{qid}': answer})
+    live = {w['text']: w['weight'] for w in _stats(app, qid)['results']}
+    assert live == {'apple': 3, 'banana': 2}
+    with app.app_context():
+        exact = {w['text']: w['weight'] for w in get_question_stats(qid, exact=True)['results']}
+        db.session.remove()
+        db.drop_all()
+    assert exact == {'apple': 3, 'banana': 2, 'cherry': 1, 'damson': 1}
+
+
+def test_short_answer_feed_pages_by_cursor():
+    from classpulse.stats import short_answers
+    from conftest import make_app
+    app = make_app({'SHORT_ANSWER_PAGE_SIZE': 2})
+    sid, qid = setup_live(app, q_type='short_answer', options={})
+    for i in range(5):
+        add_response(app, qid, sid, f'answer {i}', f'00000000-0000-4000-8000-00000000000{i}')
+    with app.app_context():
+        first = short_answers(qid)
+        assert [a['text'] for a in first['answers']] == ['answer 4', 'answer 3']
+        second = short_answers(qid, before=first['older'])
+        assert [a['text'] for a in second['answers']] == ['answer 2', 'answer 1']
+        last = short_answers(qid, before=second['older'])
+        assert [a['text'] for a in last['answers']] == ['answer 0'] and last['older'] is None
+        assert short_answers(qid, since=first['newest'])['answers'] == []
+        caught_up = short_answers(qid, since=last['newest'])
+        assert [a['text'] for a in caught_up['answers']] == ['answer 2', 'answer 1']
+        assert caught_up['more_newer']
+        db.session.remove()
+        db.drop_all()
+
+
+def test_answers_endpoint_is_owner_only(app, client):
+    sid, qid = setup_live(app, q_type='short_answer', options={})
+    _respond(app, qid, {f'response-{qid}': 'hello'})
+    create_user(app, 'mallory')
+    intruder = app.test_client()
+    login(intruder, 'mallory')
+    assert intruder.get(f'/questions/{qid}/answers').status_code == 403
+    login(client, 'alice')
+    body = client.get(f'/questions/{qid}/answers').get_json()
+    assert [a['text'] for a in body['answers']] == ['hello']
+
+
+def test_numeric_histogram_and_quantiles(app):
+    sid, qid = setup_live(app, q_type='numeric', options={'min': 0, 'max': 10})
+    for value in ('1', '2.50', '2.5', '4', '10'):
+        _respond(app, qid, {f'response-{qid}': value})
+    stats = _stats(app, qid)
+    assert stats['total_responses'] == 5
+    assert stats['results']['0–1'] == 0 and stats['results']['1–2'] == 1
+    assert stats['results']['2–3'] == 2 and stats['results']['9–10'] == 1  # hi is inclusive
+    assert sum(stats['results'].values()) == 5
+    assert stats['average'] == 4.0
+    assert (stats['q1'], stats['median'], stats['q3']) == (2.5, 2.5, 4.0)
+
+
+def test_numeric_quantiles_interpolate_and_follow_overwrites(app):
+    sid, qid = setup_live(app, q_type='numeric', options={})
+    c = _respond(app, qid, {f'response-{qid}': '1'})
+    _respond(app, qid, {f'response-{qid}': '2'})
+    _respond(app, qid, {f'response-{qid}': '3'})
+    _respond(app, qid, {f'response-{qid}': '4'})
+    assert _stats(app, qid)['median'] == 2.5
+    c.post(f'/audience/respond/{qid}', data={f'response-{qid}': '9'}, headers=AJAX)
+    stats = _stats(app, qid)
+    assert (stats['q1'], stats['median'], stats['q3']) == (2.75, 3.5, 5.25)
+    assert stats['results'] == {**dict.fromkeys(stats['results'], 0), '2–2.7': 1,
+                                '2.7–3.4': 1, '3.4–4.1': 1, '8.3–9': 1}